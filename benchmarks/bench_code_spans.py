@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+exclude_code パーサーのコードブロック・スタックトレース畳み込み（_compact_code_spans）を確認し、処理時間を測る。
+
+    python3 benchmarks/bench_code_spans.py [--mb 10] [--repeat 3]
+
+計測の前に、<pre> で囲まれたノートなど畳んではいけない入力で本文が残ることを確認する。
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redmine_ticket_qa_segment_parser_exclude_code as parser  # noqa: E402
+from bench_remove_logs import build_text  # noqa: E402
+
+SEPARATOR = "-------------------------------------------"
+CASEID = "1234567890"
+
+
+def build_ticket(answer_notes):
+    return {
+        "issue": {
+            "description": f"Question\n{SEPARATOR}\n設定方法を教えてください",
+            "created_on": "2024-01-01T00:00:00Z",
+            "custom_fields": [{"name": "caseid", "value": CASEID}],
+            "journals": [
+                {"notes": f"<pre>\nQuestion\n{SEPARATOR}\n追加の質問です\n</pre>", "created_on": "2024-01-01T01:00:00Z"},
+                {"notes": answer_notes, "created_on": "2024-01-01T02:00:00Z"},
+            ],
+        }
+    }
+
+
+def check_regressions():
+    """畳み込みで本文が失われないことを確認し、失敗した項目の説明を返す。"""
+    failures = []
+
+    # <pre> でノート全体を囲む書式（従来どおり本文が残ること）
+    result = parser.main(build_ticket(f"<pre>\nAnswer\n{SEPARATOR}\n{CASEID}\n回答本文です\n</pre>"))
+    texts = [entry["text"] for entry in result["entries"]]
+    if result["status"] != "ok" or texts != ["設定方法を教えてください", "追加の質問です", f"{CASEID}\n回答本文です"]:
+        failures.append(f"<pre> で囲まれたノート: {result}")
+
+    # 区切り線より前で開き、本文の後で閉じる <pre>
+    compacted = parser._compact_code_spans(parser._extract_after_text(f"Answer <pre>\n{SEPARATOR}\n{CASEID}\n回答\n本文\n</pre>"))
+    if "回答\n本文" not in compacted:
+        failures.append(f"区切り線をまたぐ <pre>: {compacted!r}")
+
+    # 閉じタグのない <code> が以降の本文を飲み込まないこと
+    compacted = parser._compact_code_spans("see <code>foo …\nline2\nline3")
+    if compacted != "see <code>foo …\nline2\nline3":
+        failures.append(f"閉じタグのない <code>: {compacted!r}")
+
+    # 閉じていないフェンスが以降の本文を飲み込まないこと
+    compacted = parser._compact_code_spans("```\nunclosed fence\nline2\nline3")
+    if compacted != "```\nunclosed fence\nline2\nline3":
+        failures.append(f"閉じていないフェンス: {compacted!r}")
+
+    # 本文中の複数行のコード・スタックトレースは畳まれること
+    compacted = parser._compact_code_spans(f"{CASEID}\n回答\n<pre>\na\nb\n</pre>\nError\n\tat a.B.c(B.java:1)\n\tat a.B.d(B.java:2)")
+    if compacted != f"{CASEID}\n回答\n【コード省略: 2行】\nError\n【スタックトレース省略: 2行, 先頭: at a.B.c(B.java:1)】":
+        failures.append(f"コード・スタックトレースの畳み込み: {compacted!r}")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--mb", type=int, default=10, help="本文のおおよそのサイズ(MB, UTF-8)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    failures = check_regressions()
+    if failures:
+        for failure in failures:
+            print(f"NG: {failure}")
+        return 1
+    print("畳み込みの確認: OK")
+
+    text = build_text(args.mb)
+    best = min(timeit.repeat(lambda: parser._compact_code_spans(text), number=1, repeat=args.repeat))
+    compacted = parser._compact_code_spans(text)
+    print(f"本文: {len(text.encode('utf-8')) / 1024 / 1024:.1f} MB → {len(compacted.encode('utf-8')) / 1024 / 1024:.1f} MB")
+    print(f"  _compact_code_spans: {best * 1000:9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+INFOレベル運用時に、Dify応答・Adaptive Card のデバッグ出力の整形がどれだけ掛かっていたかを測る。
+
+    python3 benchmarks/bench_debug_logging.py [--kb 256] [--repeat 200]
+
+eager: 変更前と同じ f-string + json.dumps(indent=2) を logging.debug に渡す
+lazy : 現在の call_dify / parse_dify_result / send_adaptive_card（isEnabledFor ガード・%書式）
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="bench_debug_logging_")
+for _key, _name in (
+    ("LOG_FILE", "monitor.log"),
+    ("STATE_DB", "state.db"),
+    ("REVIEW_RESULT_LOG", "review_results.jsonl"),
+    ("REVIEW_RESULT_EXCEL", "review_results.xlsx"),
+):
+    os.environ.setdefault(_key, os.path.join(_TMP, _name))
+os.environ["LOG_LEVEL"] = "INFO"
+os.environ["DIFY_RESPONSE_MODE"] = "blocking"
+
+import redmine_dify_monitor as monitor  # noqa: E402
+
+
+class _FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+def build_dify_response(size_kb):
+    """査閲結果を含む size_kb KB 程度の outputs と、ノード実行情報を持つ blocking 応答。"""
+    body = "確認しました。ログの該当箇所を添付します。\n" * (size_kb * 1024 // 60 + 1)
+    text = f"査閲結果：承認\n理由：回答が質問に対応しています。\n{body}"
+    outputs = json.dumps({"status": "ok", "text": text, "comment": "問題なし"}, ensure_ascii=False)
+    return {
+        "workflow_run_id": "bench",
+        "data": {
+            "id": "bench",
+            "status": "succeeded",
+            "outputs": outputs,
+            "elapsed_time": 12.3,
+            "total_tokens": 4096,
+        },
+    }
+
+
+def eager_per_ticket(ticket_id, data, card):
+    """変更前の call_dify / parse_dify_result / send_adaptive_card が行っていた整形のみを再現する。"""
+    headers = {"Authorization": "Bearer x", "Content-Type": "application/json"}
+    payload = {"inputs": {"ticketid": ticket_id, "LLM": "GPT"}, "response_mode": "blocking", "user": "redmine-monitor"}
+    logging.debug(f"Dify呼び出し開始 URL={monitor.DIFY_API_URL}")
+    logging.debug(f"Difyリクエストヘッダ: {json.dumps(headers, ensure_ascii=False, indent=2)}")
+    logging.debug(f"Difyリクエストペイロード: {json.dumps(payload, ensure_ascii=False, indent=2)}")
+    logging.debug(f"Dify応答(JSON): {json.dumps(data, ensure_ascii=False, indent=2)}")
+    text = json.loads(data["data"]["outputs"])["text"]
+    logging.debug(f"Dify応答本文: {repr(text[:300])}")
+    logging.debug(f"送信カード内容:\n{json.dumps(card, ensure_ascii=False, indent=2)}")
+
+
+def lazy_per_ticket(ticket_id):
+    text, _, _ = monitor.call_dify(ticket_id)
+    result = monitor.parse_dify_result(text)
+    outbox = []
+    body = [{"type": "TextBlock", "text": f"{result['査閲結果']}: {result['理由']}", "wrap": True}, {"type": "TextBlock", "text": text, "wrap": True}]
+    monitor.send_adaptive_card(["https://example.invalid/hook"], body, summary="bench", outbox=outbox, dedup_key="bench")
+    return outbox[0]["payload"]
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--kb", type=int, default=256, help="Dify応答 outputs のおおよそのサイズ(KB)")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO)
+    data = build_dify_response(args.kb)
+
+    with mock.patch.object(monitor.http_client, "request", return_value=_FakeResponse(data)):
+        card = lazy_per_ticket(0)
+        lazy = timed(lazy_per_ticket, args.repeat)
+    eager_only = timed(lambda i: eager_per_ticket(i, data, card), args.repeat)
+
+    print(f"Dify応答サイズ: {len(json.dumps(data, ensure_ascii=False).encode('utf-8')) / 1024:.0f} KB, 試行: {args.repeat} 回 (LOG_LEVEL=INFO)")
+    print(f"  変更後 call_dify+parse+card 1件あたり : {lazy * 1000:8.3f} ms")
+    print(f"  変更前に追加で掛かっていた整形 1件あたり: {eager_only * 1000:8.3f} ms")
+    print(f"  → 変更前の推定 1件あたり            : {(lazy + eager_only) * 1000:8.3f} ms（{(lazy + eager_only) / lazy:.1f} 倍）")
+
+
+if __name__ == "__main__":
+    main()
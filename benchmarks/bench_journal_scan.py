@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+journals が数千件あるチケットで3つのQ&Aパーサーの処理時間を測り、件数に対して線形に伸びることを確認する。
+
+    python3 benchmarks/bench_journal_scan.py [--sizes 500,1000,2000,4000,8000,16000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import redmine_ticket_qa_parser  # noqa: E402
+import redmine_ticket_qa_segment_parser  # noqa: E402
+import redmine_ticket_qa_segment_parser_exclude_code  # noqa: E402
+
+SEPARATOR = "-------------------------------------------"
+CASEID = "1234567890"
+
+
+def build_issue(journal_count, seed=0):
+    """質問・回答・その他のメモが混在するチケット。最後は回答で終わり、回答後に他のメモが続く。"""
+    rng = random.Random(seed)
+    journals = []
+    for i in range(journal_count):
+        kind = rng.random()
+        if kind < 0.3:
+            notes = f"お客様からの Question です\n{SEPARATOR}\n設定方法を教えてください ({i})"
+        elif kind < 0.6:
+            notes = f"Answer\n{SEPARATOR}\n{CASEID}\n回答します。\n2024-01-01 00:00:00 INFO ログ\n手順は以下のとおりです ({i})"
+        else:
+            notes = f"ステータス変更・担当者変更などのメモ ({i})"
+        journals.append({"notes": notes, "created_on": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z#{i:06d}"})
+    journals.append({"notes": f"Answer\n{SEPARATOR}\n{CASEID}\n最終回答", "created_on": "2099-01-01T00:00:00Z"})
+    journals.extend({"notes": "社内メモ", "created_on": "2099-01-02T00:00:00Z"} for _ in range(journal_count // 10))
+    return {
+        "issue": {
+            "description": f"Question\n{SEPARATOR}\n初回の質問",
+            "created_on": "2024-01-01T00:00:00Z",
+            "custom_fields": [{"name": "caseid", "value": CASEID}],
+            "journals": journals,
+        }
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", default="500,1000,2000,4000,8000,16000")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    parsers = [
+        ("qa_parser", redmine_ticket_qa_parser.main),
+        ("segment_parser", redmine_ticket_qa_segment_parser.main),
+        ("exclude_code", redmine_ticket_qa_segment_parser_exclude_code.main),
+    ]
+    print(f"{'journals':>9} " + " ".join(f"{name:>24}" for name, _ in parsers))
+    for size in sizes:
+        issue = build_issue(size)
+        cells = []
+        for _, fn in parsers:
+            best = min(timeit.repeat(lambda: fn(issue), number=1, repeat=args.repeat))
+            cells.append(f"{best * 1000:9.2f} ms ({best / size * 1e6:5.2f} µs/件)")
+        print(f"{size:>9} " + " ".join(f"{cell:>24}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+セグメントパーサーの remove_logs() を、syslog を大量に貼り付けた本文（既定10MB）で変更前の行ごとの実装と比較する。
+
+    python3 benchmarks/bench_remove_logs.py [--mb 10] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import redmine_ticket_qa_segment_parser  # noqa: E402
+import redmine_ticket_qa_segment_parser_exclude_code  # noqa: E402
+
+
+def line_by_line_remove_logs(text):
+    """変更前の remove_logs（行ごとに未コンパイルの re.match を2回と strip）。"""
+    if not text:
+        return ""
+    lines = text.splitlines()
+    filtered = []
+    for line in lines:
+        if re.match(r"^\s*(\d{4}-\d{2}-\d{2}|\d{2}:\d{2}:\d{2}|INFO|ERROR|DEBUG|TRACE)", line):
+            continue
+        if re.match(r"^\s*[{\[].*[}\]]\s*$", line):
+            continue
+        if len(line.strip()) > 200:
+            continue
+        filtered.append(line)
+    cleaned = "\n".join(filtered).strip()
+    return cleaned if cleaned else "[ログ省略]"
+
+
+def build_text(size_mb, seed=0):
+    """回答本文の間に syslog・JSON・スタックトレース・長大行を貼り付けた本文。"""
+    rng = random.Random(seed)
+    samples = [
+        "2024-01-02T03:04:05.123+09:00 host app[1234]: connection reset by peer",
+        "Jan  2 03:04:05 host kernel: [12345.678] eth0: link down",
+        "03:04:05 DEBUG worker-3 polling queue size=12",
+        "ERROR com.example.Service - request failed",
+        '{"level": "info", "msg": "request done", "elapsed_ms": 12}',
+        "    at com.example.Service.handle(Service.java:123)",
+        "A" * 320,
+        "ご確認ありがとうございます。ログを確認したところ、以下の設定が原因と思われます。",
+        "手順: 設定画面 > 詳細 > タイムアウト値を 30 秒に変更してください。",
+        "",
+    ]
+    weights = [20, 15, 15, 10, 10, 10, 2, 8, 8, 2]
+    target = size_mb * 1024 * 1024
+    lines = []
+    size = 0
+    while size < target:
+        line = rng.choices(samples, weights)[0]
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--mb", type=int, default=10, help="本文のおおよそのサイズ(MB, UTF-8)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    text = build_text(args.mb)
+    expected = line_by_line_remove_logs(text)
+    cases = [
+        ("line-by-line (変更前)", line_by_line_remove_logs),
+        ("segment_parser", redmine_ticket_qa_segment_parser._remove_logs),
+        ("exclude_code", redmine_ticket_qa_segment_parser_exclude_code._remove_logs),
+    ]
+    for name, fn in cases[1:]:
+        if fn(text) != expected:
+            print(f"{name}: 変更前と結果が一致しません")
+            return 1
+
+    print(f"本文: {len(text.encode('utf-8')) / 1024 / 1024:.1f} MB, {text.count(chr(10)) + 1} 行 → 残り {len(expected)} 文字")
+    baseline = None
+    for name, fn in cases:
+        best = min(timeit.repeat(lambda: fn(text), number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f"  {name:22s}: {best * 1000:9.1f} ms  ({baseline / best:4.1f} 倍)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+normalize_timestamp() の dateutil 版と timestamp_utils 版（fromisoformat の高速経路）を比較する。
+
+    python3 benchmarks/bench_timestamps.py [--count 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from dateutil import parser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from timestamp_utils import normalize_timestamp, parse_timestamp_utc  # noqa: E402
+
+
+def dateutil_normalize(ts):
+    """変更前の normalize_timestamp。"""
+    try:
+        return parser.parse(ts).astimezone(timezone.utc).isoformat()
+    except Exception:
+        return ts
+
+
+def build_inputs(count):
+    base = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    rng = random.Random(0)
+    return [
+        (base + timedelta(seconds=rng.randrange(0, 6 * 365 * 86400))).strftime("%Y-%m-%dT%H:%M:%SZ")
+        for _ in range(count)
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--count", type=int, default=100000, help="Redmine形式のタイムスタンプ件数")
+    args = ap.parse_args()
+
+    inputs = build_inputs(args.count)
+    # 変換結果が変更前と同じことを確認する（Redmine形式・オフセット付き・小数秒・非ISO表記）
+    samples = inputs[:1000] + ["2024-01-02T03:04:05+09:00", "2024-01-02T03:04:05.123Z", "2024/01/02 03:04:05 +0000", "invalid"]
+    mismatches = [ts for ts in samples if normalize_timestamp(ts) != dateutil_normalize(ts)]
+    if mismatches:
+        print(f"変換結果が一致しません: {mismatches[:5]}")
+        return 1
+
+    cases = [
+        ("dateutil normalize", lambda: [dateutil_normalize(ts) for ts in inputs]),
+        ("fast normalize", lambda: [normalize_timestamp(ts) for ts in inputs]),
+        ("dateutil parse (prune)", lambda: [parser.parse(ts) for ts in inputs]),
+        ("fast parse_timestamp_utc", lambda: [parse_timestamp_utc(ts) for ts in inputs]),
+    ]
+    print(f"{args.count} 件のタイムスタンプ")
+    results = {}
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=1, repeat=3))
+        results[name] = best
+        print(f"  {name:26s}: {best * 1000:9.1f} ms  ({best / args.count * 1e6:6.2f} µs/件)")
+    print(f"  normalize の高速化: {results['dateutil normalize'] / results['fast normalize']:.1f} 倍")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
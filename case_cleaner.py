@@ -2,28 +2,148 @@
 # -*- coding: utf-8 -*-
 
 import os
-import shutil
+import queue
 import logging
+import threading
+import time
 
 # 削除対象ルートディレクトリ（.env の CASE_ROOT で上書き可能）
 CASE_ROOT = os.getenv("CASE_ROOT", "/var/lib/redmine_dify_monitor/casefiles")
+# 削除待ちディレクトリの退避先。rename を原子的に行うため CASE_ROOT と同じファイルシステム上に置く
+CASE_TRASH_DIR = os.path.join(CASE_ROOT, ".trash")
+# バックグラウンド削除の間引き: CASE_CLEANUP_BATCH 件削除するごとに CASE_CLEANUP_PAUSE 秒休む
+CASE_CLEANUP_BATCH = max(1, int(os.getenv("CASE_CLEANUP_BATCH", "200")))
+CASE_CLEANUP_PAUSE = float(os.getenv("CASE_CLEANUP_PAUSE", "0.05"))
+
+
+class CaseDirectoryCleaner:
+    """
+    ゴミ箱（CASE_TRASH_DIR）へ移動済みのディレクトリを専用スレッドで削除する。
+    ファイルを batch 件削除するごとに pause 秒休み、監視ループやDify解析のI/Oを圧迫しないようにする。
+    起動時にゴミ箱に残っているもの（前回削除中に停止した分）も削除対象にする。
+    """
+
+    def __init__(self, trash_dir: str = CASE_TRASH_DIR, *, batch: int = CASE_CLEANUP_BATCH, pause: float = CASE_CLEANUP_PAUSE):
+        self.trash_dir = trash_dir
+        self.batch = max(1, batch)
+        self.pause = pause
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            if os.path.isdir(self.trash_dir):
+                for name in sorted(os.listdir(self.trash_dir)):
+                    self._queue.put((os.path.join(self.trash_dir, name), None, None))
+            self._thread = threading.Thread(target=self._run, name="case-cleaner", daemon=True)
+            self._thread.start()
+
+    def submit(self, path: str, caseid=None, ticket_id=None) -> None:
+        """ゴミ箱内のディレクトリを削除キューに積む。"""
+        self.start()
+        self._queue.put((path, caseid, ticket_id))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout=None) -> None:
+        """削除中のディレクトリで中断して停止する（残りは次回起動時に削除）。"""
+        self._stopping.set()
+        self._queue.put(None)
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None or self._stopping.is_set():
+                return
+            path, caseid, ticket_id = item
+            suffix = f" (ticket#{ticket_id})" if ticket_id else ""
+            label = f"caseid={caseid}" if caseid else os.path.basename(path)
+            started = time.monotonic()
+            try:
+                removed = self._remove_tree(path)
+            except Exception as e:
+                logging.error(f"case_cleaner: {label} のディレクトリ削除失敗{suffix}: {path}: {e}")
+                continue
+            if removed is None:
+                logging.info(f"case_cleaner: {label} の削除を中断しました（次回起動時に再開）: {path}")
+                return
+            logging.info(
+                f"✅ case_cleaner: {label} のディレクトリ削除成功{suffix}: "
+                f"{removed}件, {time.monotonic() - started:.1f}秒"
+            )
+
+    def _remove_tree(self, path: str):
+        """path 以下をファイル単位で間引きながら削除し、削除したエントリ数を返す。停止要求で中断した場合None。"""
+        if not os.path.lexists(path):
+            return 0
+        if not os.path.isdir(path) or os.path.islink(path):
+            os.unlink(path)
+            return 1
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+            for name in filenames:
+                os.unlink(os.path.join(dirpath, name))
+                removed += 1
+                if removed % self.batch == 0:
+                    if self._stopping.is_set():
+                        return None
+                    time.sleep(self.pause)
+            for name in dirnames:
+                full = os.path.join(dirpath, name)
+                if os.path.islink(full):
+                    os.unlink(full)  # os.walk はシンボリックリンク先を辿らない
+                else:
+                    os.rmdir(full)
+                removed += 1
+        os.rmdir(path)
+        return removed + 1
+
+
+cleaner = CaseDirectoryCleaner()
+
+
+def _trash_path(caseid: str) -> str:
+    return os.path.join(CASE_TRASH_DIR, f"{caseid}.{time.time_ns()}")
 
 
 def cleanup_case_directory(caseid: str, *, ticket_id: str | int | None = None) -> bool:
-    """caseidディレクトリを削除する。caseidが無ければFalse。"""
+    """
+    caseidディレクトリをゴミ箱へ原子的に移動し（即座に見えなくなる）、実際の削除はバックグラウンドで行う。
+    移動できた場合True。caseidが無い・ディレクトリが無い・移動に失敗した場合はFalse。
+    """
     try:
         if not caseid:
             logging.info("case_cleaner: caseid 未指定のため削除スキップ。")
             return False
 
+        root = os.path.realpath(CASE_ROOT)
         target_dir = os.path.join(CASE_ROOT, str(caseid))
+        real_target = os.path.realpath(target_dir)
+        if os.path.dirname(real_target) != root or os.path.basename(real_target).startswith("."):
+            logging.warning(f"case_cleaner: caseid={caseid} は CASE_ROOT 直下を指していないため削除しません: {target_dir}")
+            return False
         if not os.path.exists(target_dir):
             logging.info(f"case_cleaner: caseid={caseid} のディレクトリが存在しません: {target_dir}")
             return False
 
-        shutil.rmtree(target_dir)
+        cleaner.start()  # 起動時のゴミ箱走査が移動直後のディレクトリを二重に拾わないよう、先に起動する
+        os.makedirs(CASE_TRASH_DIR, exist_ok=True)
+        trash_path = _trash_path(caseid)
+        os.rename(target_dir, trash_path)
+        cleaner.submit(trash_path, caseid, ticket_id)
         suffix = f" (ticket#{ticket_id})" if ticket_id else ""
-        logging.info(f"✅ case_cleaner: caseid={caseid} のディレクトリ削除成功: {target_dir}{suffix}")
+        logging.info(f"case_cleaner: caseid={caseid} のディレクトリを削除キューに登録しました: {target_dir}{suffix}")
         return True
 
     except Exception as e:
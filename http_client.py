@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# 接続プール・リトライ設定（.env で上書き可能）
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+DEFAULT_TIMEOUT = 30
+
+# GET/PUTなど冪等なメソッドのみステータスコードで再送する。POSTは接続確立失敗時のみ再送される。
+_RETRY_STATUSES = (429, 502, 503, 504)
+
+_sessions: Dict[str, requests.Session] = {}
+_timeouts: Dict[str, float] = {}
+_pool_sizes: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def _host_key(url: str) -> str:
+    """URLから scheme://host:port 部分を取り出し、セッションのキーにする。"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=_RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def configure_host(url: str, *, timeout: Optional[float] = None, pool_size: Optional[int] = None) -> None:
+    """接続先ホストごとのタイムアウトとプールサイズを登録する。"""
+    if not url:
+        return
+    key = _host_key(url)
+    with _lock:
+        if timeout is not None:
+            _timeouts[key] = timeout
+        if pool_size is not None:
+            _pool_sizes[key] = pool_size
+            # 既存セッションはプールサイズが変わるため作り直す
+            old = _sessions.pop(key, None)
+            if old is not None:
+                old.close()
+
+
+def get_session(url: str) -> requests.Session:
+    """接続先ホスト単位でKeep-Aliveのセッションを共有する。"""
+    key = _host_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _build_session(_pool_sizes.get(key, HTTP_POOL_SIZE))
+            _sessions[key] = session
+            logger.debug("HTTPセッションを作成しました: %s", key)
+        return session
+
+
+def request(method: str, url: str, *, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+    """ホスト別のセッション・タイムアウトでリクエストを送る。"""
+    if timeout is None:
+        timeout = _timeouts.get(_host_key(url), DEFAULT_TIMEOUT)
+    return get_session(url).request(method, url, timeout=timeout, **kwargs)
+
+
+def close_all() -> None:
+    """全セッションを閉じる（終了時用）。"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
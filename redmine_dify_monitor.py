@@ -3,33 +3,71 @@
 
 import requests
 import json
+import hashlib
 import logging
 import time
-from datetime import datetime, timezone
-from dateutil import parser
+from datetime import timezone
 import os
 import re
 from logging.handlers import RotatingFileHandler
 import traceback
 import signal
 import sys
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import PatternFill
-from case_cleaner import cleanup_case_directory
-from state_manager import load_processed_issues, save_processed_issue, prune_stale_issues
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from case_cleaner import cleaner as case_cleaner, cleanup_case_directory
+import http_client
+import metrics
+from review_result_writer import ExcelResultWriter, JsonlResultLog
+from webhook_dispatcher import OutboxSender, WebhookDispatcher
+import redmine_ticket_qa_parser
+import review_result_parser
+from state_manager import StateStore, requeue_claimed_jobs
+from timestamp_utils import normalize_timestamp, parse_timestamp
 
 # --- 設定 ---
 REDMINE_URL = os.getenv("REDMINE_URL", "http://localhost:3000")
 REDMINE_API_KEY = os.getenv("REDMINE_API_KEY", "your_redmine_api_key")
+# incremental: 高水位マーク以降の更新を全ページ取得 / recent: 直近73件のみ取得（従来動作）
+REDMINE_FETCH_MODE = os.getenv("REDMINE_FETCH_MODE", "incremental").strip().lower()
+REDMINE_PAGE_SIZE = int(os.getenv("REDMINE_PAGE_SIZE", "100"))  # Redmine APIの上限は100
 
 DIFY_API_URL = os.getenv("DIFY_API_URL", "http://localhost:5001/v1/workflows/execute")
 DIFY_API_KEY = os.getenv("DIFY_API_KEY", "your_dify_api_key")
 DIFY_LLM = os.getenv("DIFY_LLM", "GPT")
+# Q&A内容が前回解析時から変わっていなければDifyを呼ばず前回結果を再利用する
+# journals付きチケットを redmine_ticket_qa_parser で事前判定し、status=ok のときだけDifyを呼ぶ
+DIFY_PRESCREEN_ENABLED = os.getenv("DIFY_PRESCREEN_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+DIFY_CACHE_ENABLED = os.getenv("DIFY_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
 
 TEAMS_WEBHOOK_URL = os.getenv("TEAMS_WEBHOOK_URL", "https://graph.microsoft.com/...")
 TEAMS_WEBHOOK_SECONDARY_URL = os.getenv("TEAMS_WEBHOOK_SECONDARY_URL", "")
+TEAMS_SEND_WORKERS = int(os.getenv("TEAMS_SEND_WORKERS", "4"))  # Webhook並列送信数
+TEAMS_MAX_ATTEMPTS = int(os.getenv("TEAMS_MAX_ATTEMPTS", "3"))  # Webhookごとの最大送信試行回数
+# 査閲結果・caseid不一致アラートをTeamsへ通知する（状態DBのアウトボックス経由で送信）
+TEAMS_NOTIFY_ENABLED = os.getenv("TEAMS_NOTIFY_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+TEAMS_OUTBOX_MAX_ATTEMPTS = int(os.getenv("TEAMS_OUTBOX_MAX_ATTEMPTS", "8"))  # アウトボックス通知の最大送信試行回数
+TEAMS_OUTBOX_BACKOFF_MAX = float(os.getenv("TEAMS_OUTBOX_BACKOFF_MAX", "600"))  # 再送間隔の上限（秒）
+TEAMS_OUTBOX_RETENTION_DAYS = int(os.getenv("TEAMS_OUTBOX_RETENTION_DAYS", "7"))  # 送信済み・送信断念の通知を保持する日数（0で削除しない）
 
 POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "60"))  # 秒単位
+DIFY_WORKERS = max(1, int(os.getenv("DIFY_WORKERS", "4")))  # Dify解析の同時実行数
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", "10000"))  # メモリに保持する処理済みチケット数（LRU）
+STATE_PRUNE_DAYS = int(os.getenv("STATE_PRUNE_DAYS", "180"))  # この日数より前に更新されたチケットの記録を削除（0で無効）
+STATE_PRUNE_INTERVAL = float(os.getenv("STATE_PRUNE_INTERVAL", "3600"))  # 削除処理の実行間隔（秒）
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # 解析ジョブの最大試行回数
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "60"))  # 再試行までの基準待ち時間（秒、試行ごとに倍増）
+
+# 接続先ごとのHTTPタイムアウト（秒）
+REDMINE_TIMEOUT = float(os.getenv("REDMINE_TIMEOUT", "30"))
+DIFY_TIMEOUT = float(os.getenv("DIFY_TIMEOUT", "360"))
+TEAMS_TIMEOUT = float(os.getenv("TEAMS_TIMEOUT", "10"))
+# blocking: 完了まで待つ / streaming: SSEで受信し workflow_finished で即終了
+DIFY_RESPONSE_MODE = os.getenv("DIFY_RESPONSE_MODE", "blocking").strip().lower()
+# streamingモードで ping も含めて何も受信しない状態がこの秒数続いたら打ち切る（ping は生存とみなす）
+DIFY_STREAM_IDLE_TIMEOUT = float(os.getenv("DIFY_STREAM_IDLE_TIMEOUT", "60"))
+# 処理中ジョブが他から見えなくなる時間（秒）。Difyタイムアウトより長くしておく
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", str(DIFY_TIMEOUT + 120)))
 STATE_DB = os.getenv("STATE_DB", "/var/lib/redmine_dify_monitor/processed_issues.db")
 STATE_DB_DIR = os.path.dirname(STATE_DB)
 if STATE_DB_DIR:
@@ -42,7 +80,17 @@ EXCEL_FILE = os.getenv("REVIEW_RESULT_EXCEL", "/var/lib/redmine_dify_monitor/rev
 EXCEL_DIR = os.path.dirname(EXCEL_FILE)
 if EXCEL_DIR:
     os.makedirs(EXCEL_DIR, exist_ok=True)
+# jsonl: 追記専用ログに記録し、Excelは review_result_writer.py export で生成 / excel: Excelへ直接追記
+RESULT_SINK = os.getenv("REVIEW_RESULT_SINK", "jsonl").strip().lower()
+RESULT_LOG_FILE = os.getenv("REVIEW_RESULT_LOG", "/var/lib/redmine_dify_monitor/review_results.jsonl")
+RESULT_LOG_DIR = os.path.dirname(RESULT_LOG_FILE)
+if RESULT_LOG_DIR:
+    os.makedirs(RESULT_LOG_DIR, exist_ok=True)
+RESULT_FLUSH_INTERVAL = float(os.getenv("REVIEW_RESULT_FLUSH_INTERVAL", "0"))  # 秒。0ならポーリング周期ごと
 LOG_LEVEL_NAME = os.getenv("LOG_LEVEL", "INFO").upper()
+# メトリクスエンドポイント（Prometheus形式、/metrics）。0なら起動しない
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "0.0.0.0")
 try:
     LOG_LEVEL = getattr(logging, LOG_LEVEL_NAME)
     if not isinstance(LOG_LEVEL, int):
@@ -64,12 +112,22 @@ if _LOG_LEVEL_INVALID:
     logging.warning(f"LOG_LEVEL '{LOG_LEVEL_NAME}' は不正です。INFO を使用します。")
 logging.info(f"ログ初期化完了！ (LOG_LEVEL={logging.getLevelName(LOG_LEVEL)})")
 
-# --- タイムゾーン対応 ---
-def normalize_timestamp(ts):
-    try:
-        return parser.parse(ts).astimezone(timezone.utc).isoformat()
-    except Exception:
-        return ts
+# --- メトリクス ---
+FETCH_SECONDS = metrics.histogram("redmine_fetch_duration_seconds", "Redmineチケット一覧の取得（全ページ）の所要時間", ["mode"])
+FETCHED_ISSUES = metrics.counter("redmine_fetched_issues_total", "Redmineから取得したチケット数", ["mode"])
+FETCH_FAILURES = metrics.counter("redmine_fetch_failures_total", "Redmineチケット一覧の取得失敗回数", ["mode"])
+CHANGED_ISSUES = metrics.counter("redmine_changed_issues_total", "更新を検知したチケット数", ["action"])
+POLL_CYCLE_SECONDS = metrics.histogram("poll_cycle_duration_seconds", "ポーリング1周期（取得〜状態DB書き込み）の所要時間")
+DIFY_CALL_SECONDS = metrics.histogram("dify_call_duration_seconds", "Dify呼び出し（call_dify）の所要時間", ["status"])
+ANALYSIS_TOTAL = metrics.counter("analysis_total", "チケット解析の結果（source: prescreen / cache / dify）", ["source", "status"])
+JOBS_IN_FLIGHT = metrics.gauge("analysis_jobs_in_flight", "Difyワーカーに投入済みで記録待ちの解析ジョブ数")
+JOBS_QUEUED = metrics.gauge("analysis_jobs_queued", "状態DBの解析ジョブ数", ["state"])
+
+# --- HTTPクライアント（接続先ホストごとにKeep-Aliveセッションを共有） ---
+http_client.configure_host(REDMINE_URL, timeout=REDMINE_TIMEOUT)
+http_client.configure_host(DIFY_API_URL, timeout=DIFY_TIMEOUT, pool_size=max(http_client.HTTP_POOL_SIZE, DIFY_WORKERS))
+for _webhook in (TEAMS_WEBHOOK_URL, TEAMS_WEBHOOK_SECONDARY_URL):
+    http_client.configure_host(_webhook, timeout=TEAMS_TIMEOUT)
 
 
 def extract_caseid(issue):
@@ -85,18 +143,92 @@ def extract_caseid(issue):
     return ""
     
 # --- Redmine チケット取得 ---
-def get_recent_issues():
-    params = {"key": REDMINE_API_KEY, "status_id": "*", "sort": "updated_on:desc", "limit": 73}
+def _get_issues_page(params):
+    """issues.json を1ページ取得する。リトライしても失敗した場合はNone。"""
     for attempt in range(2):
         try:
-            resp = requests.get(f"{REDMINE_URL}/issues.json", params=params, timeout=30)
+            resp = http_client.request("GET", f"{REDMINE_URL}/issues.json", params=params)
             resp.raise_for_status()
-            return resp.json().get("issues", [])
+            return resp.json()
         except (requests.exceptions.RequestException, ValueError) as e:
             wait = 4 ** attempt
             logging.warning(f"Redmine取得失敗({attempt+1}/2): {e}")
             time.sleep(wait)
-    return []
+    return None
+
+
+def get_recent_issues():
+    params = {"key": REDMINE_API_KEY, "status_id": "*", "sort": "updated_on:desc", "limit": 73}
+    data = _get_issues_page(params)
+    if not data:
+        return []
+    return data.get("issues", [])
+
+
+def get_updated_issues(since):
+    """
+    since（UTC ISO形式）以降に更新されたチケットを offset/total_count で全ページ取得する。
+    途中のページ取得に失敗した場合は取りこぼしを避けるためNoneを返す。
+    """
+    since_utc = parse_timestamp(since).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    # 降順で辿ることで、ページング中に更新されたチケットは重複する側に寄る（欠落しない）
+    params = {
+        "key": REDMINE_API_KEY,
+        "status_id": "*",
+        "sort": "updated_on:desc",
+        "updated_on": f">={since_utc}",
+        "limit": REDMINE_PAGE_SIZE,
+        "offset": 0,
+    }
+    issues = {}
+    pages = 0
+    while True:
+        pages += 1
+        data = _get_issues_page(params)
+        if data is None:
+            return None
+        page = data.get("issues", [])
+        for issue in page:
+            issues.setdefault(issue["id"], issue)
+        params["offset"] += len(page)
+        if not page or params["offset"] >= int(data.get("total_count", 0)):
+            break
+    logging.debug("Redmine差分取得: since=%s 件数=%d ページ数=%d", since_utc, len(issues), pages)
+    return list(issues.values())
+
+
+def fetch_issues(watermark):
+    """取得モードに応じてチケットを取得し、(issues, 次回の高水位マーク) を返す。"""
+    mode = "incremental" if REDMINE_FETCH_MODE == "incremental" and watermark else "recent"
+    with FETCH_SECONDS.time(mode=mode):
+        if mode == "incremental":
+            issues = get_updated_issues(watermark)
+        else:
+            # インクリメンタル取得の初回も従来どおり直近分を取得し、その最新updated_onを起点にする
+            issues = get_recent_issues()
+    if issues is None:
+        FETCH_FAILURES.inc(mode=mode)
+        return [], watermark
+    FETCHED_ISSUES.inc(len(issues), mode=mode)
+
+    if REDMINE_FETCH_MODE != "incremental":
+        return issues, None
+
+    stamps = [normalize_timestamp(issue.get("updated_on", "")) for issue in issues]
+    if watermark:
+        stamps.append(watermark)
+    return issues, max((stamp for stamp in stamps if stamp), default=None)
+
+def get_issue_detail(issue_id):
+    """journals付きでチケット詳細を取得する。失敗時はNone。"""
+    params = {"key": REDMINE_API_KEY, "include": "journals"}
+    try:
+        resp = http_client.request("GET", f"{REDMINE_URL}/issues/{issue_id}.json", params=params)
+        resp.raise_for_status()
+        return resp.json().get("issue")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.warning(f"Redmineチケット詳細の取得失敗(#{issue_id}): {e}")
+        return None
 
 # --- Redmine 差し戻しステータスに更新 ---
 def update_redmine_status(issue_id, status_id):
@@ -104,7 +236,7 @@ def update_redmine_status(issue_id, status_id):
     payload = {"issue": {"status_id": status_id}}
     headers = {"X-Redmine-API-Key": REDMINE_API_KEY, "Content-Type": "application/json"}
     try:
-        requests.put(url, headers=headers, json=payload, timeout=10).raise_for_status()
+        http_client.request("PUT", url, headers=headers, json=payload).raise_for_status()
         logging.info(f"Redmineチケット #{issue_id} のステータスを更新しました。")
     except Exception as e:
         logging.error(f"Redmineステータス更新失敗: {e}")
@@ -119,27 +251,125 @@ def safe_decode_dify_text(text: str) -> str:
             pass  # 失敗したらそのまま返す
     return text
 
+# --- Dify ストリーミング応答 ---
+def _iter_sse_events(resp):
+    """
+    text/event-stream を1イベント（data行のJSON）ずつ返す。
+    ping 等の data 以外の行では None を返し、呼び出し側が行ごとにタイムアウトを確認できるようにする。
+    """
+    for raw_line in resp.iter_lines(chunk_size=1024):
+        line = raw_line.decode("utf-8", errors="replace") if raw_line else ""
+        body = line[len("data:"):].strip() if line.startswith("data:") else ""
+        if not body:
+            yield None  # "event: ping" や空行
+            continue
+        try:
+            yield json.loads(body)
+        except json.JSONDecodeError:
+            logging.warning(f"Difyストリームのイベントを解釈できません: {body[:200]}")
+            yield None
+
+
+def call_dify_streaming(ticket_id, headers, payload):
+    """
+    Difyワークフローをストリーミング(SSE)モードで実行し、workflow_finished を受信した時点で
+    blockingモードと同じ形の応答（{"data": {...}}）を返す。
+    ping も含めて何も届かない状態が DIFY_STREAM_IDLE_TIMEOUT 秒続いた場合は読み取りタイムアウトで、
+    全体で DIFY_TIMEOUT 秒を超えた場合は行ごとの確認で打ち切る（長いLLMノードの実行中は ping だけが届く）。
+    """
+    started = time.monotonic()
+    node_timings = []
+    verdict = review_result_parser.VerdictParser()  # text_chunk から生成途中で査閲結果を先行判定する
+    timeout = (min(DIFY_TIMEOUT, 30), DIFY_STREAM_IDLE_TIMEOUT)
+    with http_client.request("POST", DIFY_API_URL, headers=headers, json=payload, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        for event in _iter_sse_events(resp):
+            if event is None:
+                kind, data = None, {}
+            else:
+                kind, data = event.get("event"), event.get("data") or {}
+            if kind == "node_finished":
+                node_timings.append((data.get("title") or data.get("node_id"), data.get("elapsed_time"), data.get("status")))
+                logging.debug(
+                    "Difyノード完了 #%s: %s status=%s elapsed=%ss",
+                    ticket_id, node_timings[-1][0], data.get("status"), data.get("elapsed_time"),
+                )
+            elif kind == "text_chunk" and verdict.code is None:
+                if verdict.feed(data.get("text") or "") is not None:
+                    logging.info(
+                        f"Dify査閲結果を先行判定 #{ticket_id}: result_code={verdict.code} "
+                        f"({time.monotonic() - started:.2f}s, 生成完了前)"
+                    )
+            elif kind == "workflow_finished":
+                timings = ", ".join(f"{title}={elapsed:.2f}s" for title, elapsed, _ in node_timings if isinstance(elapsed, (int, float)))
+                logging.info(
+                    f"Difyワークフロー完了 #{ticket_id}: status={data.get('status')} "
+                    f"elapsed={data.get('elapsed_time')}s 受信完了={time.monotonic() - started:.2f}s ({timings})"
+                )
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug("Dify応答(JSON): %s", json.dumps(event, ensure_ascii=False, indent=2))
+                return {"data": data}
+            elif kind == "error":
+                logging.error(f"Difyストリームでエラーを受信しました: {event.get('code')} {event.get('message')}")
+                return None
+
+            # ping でも毎行確認する（ping だけが届き続けるストリームも DIFY_TIMEOUT で打ち切れるように）
+            if time.monotonic() - started > DIFY_TIMEOUT:
+                logging.error(f"Difyストリームが{DIFY_TIMEOUT}秒以内に完了しませんでした: チケットID={ticket_id}")
+                return None
+
+    logging.error(f"Difyストリームが workflow_finished を受信する前に終了しました: チケットID={ticket_id}")
+    return None
+
 # --- Dify 呼び出し ---
+class DifyCallError(Exception):
+    """Difyに接続できない・応答を受信しきれないなど、再試行すべき呼び出し失敗。"""
+
+
 def call_dify(ticket_id):
+    """
+    Difyワークフローを呼び出し (text, status, comment) を返す。有効な結果がない応答は (None, None, None)。
+    通信の失敗は DifyCallError を送出する（ジョブは再試行に回る）。
+    """
+    started = time.perf_counter()
+    try:
+        outcome = _call_dify(ticket_id)
+    except DifyCallError:
+        DIFY_CALL_SECONDS.observe(time.perf_counter() - started, status="error")
+        raise
+    DIFY_CALL_SECONDS.observe(time.perf_counter() - started, status=outcome[1] or "empty")
+    return outcome
+
+
+def _call_dify(ticket_id):
     DIFY_HEADERS = {"Authorization": f"Bearer {DIFY_API_KEY}", "Content-Type": "application/json"}
-    payload = {"inputs": {"ticketid": ticket_id, "LLM": DIFY_LLM}, "response_mode": "blocking", "user": "redmine-monitor"}
+    payload = {"inputs": {"ticketid": ticket_id, "LLM": DIFY_LLM}, "response_mode": DIFY_RESPONSE_MODE, "user": "redmine-monitor"}
 
-    logging.debug(f"Dify呼び出し開始 URL={DIFY_API_URL}")
-    logging.debug(f"Difyリクエストヘッダ: {json.dumps(DIFY_HEADERS, ensure_ascii=False, indent=2)}")
-    logging.debug(f"Difyリクエストペイロード: {json.dumps(payload, ensure_ascii=False, indent=2)}")
+    # DEBUG無効時は json.dumps（整形）自体を行わない
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    if debug:
+        logging.debug("Dify呼び出し開始 URL=%s", DIFY_API_URL)
+        logging.debug("Difyリクエストヘッダ: %s", json.dumps(DIFY_HEADERS, ensure_ascii=False, indent=2))
+        logging.debug("Difyリクエストペイロード: %s", json.dumps(payload, ensure_ascii=False, indent=2))
 
     try:
-        resp = requests.post(DIFY_API_URL, headers=DIFY_HEADERS, json=payload, timeout=360)
-        resp.raise_for_status()
-        try:
-            data = resp.json()
-            logging.debug(f"Dify応答(JSON): {json.dumps(data, ensure_ascii=False, indent=2)}")
-        except json.JSONDecodeError:
-            logging.error(f"Dify応答がJSONとして解釈できません: {resp.text[:200]}")
-            return None, None, None
+        if DIFY_RESPONSE_MODE == "streaming":
+            data = call_dify_streaming(ticket_id, DIFY_HEADERS, payload)
+        else:
+            resp = http_client.request("POST", DIFY_API_URL, headers=DIFY_HEADERS, json=payload)
+            resp.raise_for_status()
+            try:
+                data = resp.json()
+                if debug:
+                    logging.debug("Dify応答(JSON): %s", json.dumps(data, ensure_ascii=False, indent=2))
+            except json.JSONDecodeError:
+                logging.error(f"Dify応答がJSONとして解釈できません: {resp.text[:200]}")
+                data = None
     except Exception as e:
         logging.error(f"Dify呼び出し失敗: {e}")
-        return None, None, None
+        raise DifyCallError(str(e)) from e
+    if data is None:
+        raise DifyCallError("Difyから応答を受信できませんでした")
 
     try:
         raw_outputs = data.get("data", {}).get("outputs", "")
@@ -191,9 +421,58 @@ def call_dify(ticket_id):
         logging.error(f"Dify応答解析エラー: {e}")
         return None, None, None
     
+# --- 事前判定・解析キャッシュ ---
+def compute_qa_content_hash(extracted):
+    """redmine_ticket_qa_parser の抽出結果（質問・回答・status）からハッシュを作る。"""
+    material = json.dumps({"qa": extracted, "llm": DIFY_LLM}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def analyze_issue(store, issue_id):
+    """
+    ワーカースレッドで実行する解析処理。戻り値・例外は call_dify と同じ。
+    1. journals付きのチケットを redmine_ticket_qa_parser で事前判定し、status が ok 以外ならDifyを呼ばない
+    2. Q&A内容のハッシュが前回と同じならキャッシュ済みの結果を返す
+    3. それ以外はDifyを呼び出す
+    """
+    content_hash = None
+    if DIFY_PRESCREEN_ENABLED or DIFY_CACHE_ENABLED:
+        issue_detail = get_issue_detail(issue_id)
+        if issue_detail:
+            extracted = redmine_ticket_qa_parser.main({"issue": issue_detail})
+            status = extracted.get("status")
+            if DIFY_PRESCREEN_ENABLED and status != "ok":
+                if status == "caseid_mismatch":
+                    logging.warning(f"事前判定でcaseid_mismatchを検知: チケットID={issue_id}")
+                else:
+                    logging.info(f"事前判定ステータスが非OKのためDify呼び出しをスキップ: チケットID={issue_id} status={status}")
+                ANALYSIS_TOTAL.inc(source="prescreen", status=status or "unknown")
+                return None, status, None
+
+            if DIFY_CACHE_ENABLED:
+                content_hash = compute_qa_content_hash(extracted)
+                cached = store.load_cached_analysis(issue_id, content_hash)
+                if cached:
+                    logging.info(f"チケット #{issue_id} のQ&A内容に変更がないため前回の解析結果を再利用します。")
+                    ANALYSIS_TOTAL.inc(source="cache", status=cached[1] or "ok")
+                    return cached
+
+    try:
+        outcome = call_dify(issue_id)
+    except DifyCallError:
+        ANALYSIS_TOTAL.inc(source="dify", status="error")
+        raise
+    ANALYSIS_TOTAL.inc(source="dify", status=outcome[1] or "empty")
+    if content_hash and outcome != (None, None, None):
+        store.save_cached_analysis(issue_id, content_hash, outcome)
+    return outcome
+
 # --- Dify結果解析 ---
 def parse_dify_result(text):
-    logging.debug("=== parse_dify_result 開始 ===")
+    # DEBUG無効時は repr やマッチ結果の文字列化を行わない
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    if debug:
+        logging.debug("=== parse_dify_result 開始 ===")
 
     # バイト列（\xE6形式）で渡されるケースへの対応
     if isinstance(text, (bytes, bytearray)):
@@ -201,96 +480,65 @@ def parse_dify_result(text):
             text = text.decode("utf-8", errors="replace")
             logging.debug("textをUTF-8としてデコードしました。")
         except Exception as e:
-            logging.debug(f"textのデコードに失敗: {e}")
+            logging.debug("textのデコードに失敗: %s", e)
 
     # None や空文字対策
     if not text or str(text).strip() in ["", "null", "None"]:
-        logging.debug(f"textが空または不正: {repr(text)}")
-        logging.debug("=== parse_dify_result 結果: 不明 ===")
+        if debug:
+            logging.debug("textが空または不正: %r", text)
+            logging.debug("=== parse_dify_result 結果: 不明 ===")
         return "不明"
 
     # テキストを一旦ログに出して確認
-    logging.debug(f"Dify応答本文: {repr(text[:300])}")  # 長文の場合は先頭300文字のみ出す
+    if debug:
+        logging.debug("Dify応答本文: %r", text[:300])  # 長文の場合は先頭300文字のみ出す
 
     if not text or text.strip() in ["", "null", "None"] or re.fullmatch(r"\d+", text.strip()):
         logging.info("Dify応答が空または数字のみです。スキップします。")
         logging.debug("=== parse_dify_result 結果: None ===")
         return None
-    m_result = re.search(r"(査閲結果|結果)[:：]\s*(承認|却下)", text)
-    m_reason = re.search(r"(理由|原因)[:：]\s*(.+)", text)
-    logging.debug(f"m_result: {m_result.group(0) if m_result else 'None'}")
-    logging.debug(f"m_reason: {m_reason.group(0) if m_reason else 'None'}")
+    verdict = review_result_parser.parse_verdict(text)
+    if debug:
+        logging.debug("解析結果: %s", verdict)
 
-    if not m_result:
-        logging.debug("査閲結果の正規表現にマッチしませんでした。")
-        logging.debug("=== parse_dify_result 結果: 不明 ===")
-        return {"査閲結果": "不明", "理由": "判定なし"}
+    if verdict["code"] not in (1, 2):
+        if debug:
+            logging.debug("査閲結果が承認・却下のいずれでもありません。")
+            logging.debug("=== parse_dify_result 結果: 不明 ===")
+        return {"査閲結果": "不明", "理由": verdict["reason"] if verdict["code"] == 0 and verdict["reason"] else "判定なし"}
 
-    result = m_result.group(2)
-    reason = m_reason.group(2).strip() if m_reason else "理由なし"
+    result = {"査閲結果": verdict["label"], "理由": verdict["reason"] or "理由なし"}
+    if verdict["comment"]:
+        result["comment"] = verdict["comment"]  # Dify出力の comment があればそちらで上書きされる
 
-    logging.debug(f"抽出結果 → 査閲結果: {result}, 理由: {reason}")
-    logging.debug("=== parse_dify_result 正常終了 ===")
+    if debug:
+        logging.debug("抽出結果 → 査閲結果: %s, 理由: %s", result["査閲結果"], result["理由"])
+        logging.debug("=== parse_dify_result 正常終了 ===")
 
-    return {"査閲結果": m_result.group(2), "理由": m_reason.group(2).strip() if m_reason else "理由なし"}
+    return result
 
-# --- Excel 追記 ---
-def append_result_to_excel(issue, result):
-    if not result:
-        return
+# --- 査閲結果の記録 ---
+# jsonl: 追記専用ログへ書き、fsyncはポーリング周期ごと（RESULT_FLUSH_INTERVAL 秒以上経過時）と終了時にまとめる
+# excel: 行をメモリに溜め、同じタイミングでExcelへまとめて追記する
+if RESULT_SINK == "excel":
+    result_writer = ExcelResultWriter(EXCEL_FILE, default_llm=DIFY_LLM, flush_interval=RESULT_FLUSH_INTERVAL)
+else:
+    result_writer = JsonlResultLog(RESULT_LOG_FILE, default_llm=DIFY_LLM, flush_interval=RESULT_FLUSH_INTERVAL)
 
-    try:
-        if not os.path.exists(EXCEL_FILE):
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "査閲結果"
-            ws.append(["記録日時", "チケットID", "件名", "査閲結果", "理由", "Comment", "使用LLM"])
-            wb.save(EXCEL_FILE)
-
-        wb = load_workbook(EXCEL_FILE)
-        ws = wb.active
-        header = [cell.value for cell in ws[1]]
-        if "使用LLM" not in header:
-            ws.cell(row=1, column=len(header) + 1).value = "使用LLM"
-            header.append("使用LLM")
-        if "Comment" not in header:
-            ws.cell(row=1, column=len(header) + 1).value = "Comment"
-            header.append("Comment")
-
-        recorded_at = datetime.now(timezone.utc).astimezone().strftime("%Y-%m-%d %H:%M:%S%z")
-        row_map = {
-            "記録日時": recorded_at,
-            "チケットID": issue.get("id"),
-            "件名": issue.get("subject"),
-            "査閲結果": result.get("査閲結果", "不明"),
-            "理由": result.get("理由", ""),
-            "Comment": result.get("comment", ""),
-            "使用LLM": result.get("LLM", DIFY_LLM),
-        }
-        row = [row_map.get(col, "") for col in header]
-        ws.append(row)
-
-        latest_row = ws.max_row
-        result_value = (result.get("査閲結果") or "").strip()
-        fill_color = {
-            "承認": "C6EFCE",  # Light green
-            "却下": "FFC7CE",  # Light red
-            "不明": "D9D9D9",  # Gray
-        }.get(result_value, "FFFFFF")
-
-        if fill_color != "FFFFFF":
-            fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
-            for cell in ws[latest_row]:
-                cell.fill = fill
-
-        wb.save(EXCEL_FILE)
-        logging.debug(f"Excelに査閲結果を追記しました: {EXCEL_FILE} (行: {latest_row})")
-    except Exception as e:
-        logging.error(f"Excel追記に失敗しました: {e}")
+
+def append_result_to_excel(issue, result):
+    result_writer.append(issue, result)
 
 # --- Teams投稿 ---
-def send_adaptive_card(webhooks, body, summary=None, version="1.4", additional_content=None, success_label=None):
-    """Teams Webhook / Power Automate 向けの共通送信処理"""
+teams_dispatcher = WebhookDispatcher(max_workers=TEAMS_SEND_WORKERS, max_attempts=TEAMS_MAX_ATTEMPTS)
+outbox_sender = None  # main() で状態DBの通知アウトボックス送信スレッドを起動する
+
+
+def send_adaptive_card(webhooks, body, summary=None, version="1.4", additional_content=None, success_label=None, outbox=None, dedup_key=None):
+    """
+    Teams Webhook / Power Automate 向けの共通送信処理。
+    outbox（リスト）を渡した場合は送信せず、Webhookごとの通知アウトボックス登録内容を追加する。
+    """
     card_content = {
         "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
         "type": "AdaptiveCard",
@@ -310,24 +558,26 @@ def send_adaptive_card(webhooks, body, summary=None, version="1.4", additional_c
     if summary:
         payload["summary"] = summary
 
-    logging.debug(f"送信カード内容:\n{json.dumps(payload, ensure_ascii=False, indent=2)}")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("送信カード内容:\n%s", json.dumps(payload, ensure_ascii=False, indent=2))
+
+    if outbox is not None:
+        for webhook in webhooks:
+            if webhook:
+                outbox.append({
+                    "dedup_key": f"{dedup_key}:{webhook}",
+                    "webhook": webhook,
+                    "payload": payload,
+                    "label": success_label,
+                })
+        return
 
-    for webhook in webhooks:
-        for attempt in range(3):
-            try:
-                resp = requests.post(webhook, json=payload, timeout=10)
-                resp.raise_for_status()
-                label = f" ({success_label})" if success_label else ""
-                logging.info(f"Teams送信成功{label} → {webhook}")
-                break
-            except Exception as e:
-                wait = 2 ** attempt
-                logging.warning(f"Teams送信失敗({attempt+1}/3): {e}")
-                time.sleep(wait)
+    # 各Webhookへ並列に送信し、失敗時の再送はバックグラウンドの遅延キューで行う（呼び出し元は待たない）
+    teams_dispatcher.post(webhooks, payload, label=success_label)
 
 
-def post_to_teams(issue, result):
-    """Adaptive CardをTeamsに投稿"""
+def post_to_teams(issue, result, outbox=None, dedup_key=None):
+    """Adaptive CardをTeamsに投稿（outbox指定時はアウトボックスへの登録内容を追加）"""
     ticket_id = issue["id"]
     subject = issue["subject"]
     m_result = result["査閲結果"]
@@ -397,10 +647,10 @@ def post_to_teams(issue, result):
         }
 
     summary = f"Redmine チケット #{ticket_id} {m_result}"
-    send_adaptive_card(webhooks, [bg_style], summary=summary, success_label=m_result)
+    send_adaptive_card(webhooks, [bg_style], summary=summary, success_label=m_result, outbox=outbox, dedup_key=dedup_key)
 
-def post_caseid_mismatch_alert(issue):
-    """caseidが一致しない場合の高優先度アラート"""
+def post_caseid_mismatch_alert(issue, outbox=None, dedup_key=None):
+    """caseidが一致しない場合の高優先度アラート（outbox指定時はアウトボックスへの登録内容を追加）"""
     ticket_id = issue["id"]
     subject = issue["subject"]
     webhooks = [TEAMS_WEBHOOK_URL]
@@ -442,96 +692,229 @@ def post_caseid_mismatch_alert(issue):
     }
 
     summary = f"Redmine チケット #{ticket_id} caseid mismatch"
-    send_adaptive_card(webhooks, [container], summary=summary, success_label="caseid_mismatch")
+    send_adaptive_card(webhooks, [container], summary=summary, success_label="caseid_mismatch", outbox=outbox, dedup_key=dedup_key)
 
 # --- SIGTERM対応 ---
 def handle_shutdown(signum, frame):
     logging.info(f"停止シグナル({signum})を受信しました。終了します。")
+    http_client.close_all()
     sys.exit(0)
 
-# --- メインループ ---
-def main():
-    processed = load_processed_issues(STATE_DB)  # issue_id→updated_on のキャッシュ
+# --- 解析結果の記録 ---
+def record_analysis(issue, updated_on, outcome, outbox):
+    """
+    Dify解析結果（call_dify の戻り値）を記録する。メインスレッドから投入順に呼ぶ。
+    Teams通知は送信せず outbox（リスト）に追加し、呼び出し元がジョブ完了と同じトランザクションで登録する。
+    """
+    issue_id = issue["id"]
+    subject = issue["subject"]
+    result_text, dify_status, dify_comment = outcome
+    dedup_key = f"{issue_id}:{updated_on}"
+
+    if dify_status == "caseid_mismatch":
+        logging.warning(f"caseid mismatch 検知: チケット #{issue_id} ({subject})")
+        if TEAMS_NOTIFY_ENABLED:
+            post_caseid_mismatch_alert(issue, outbox=outbox, dedup_key=f"{dedup_key}:caseid_mismatch")
+        return
+    if dify_status and dify_status != "ok":
+        return  # 非OKステータスは call_dify 側でログ出力済み
+    if not result_text:
+        logging.info("Dify応答なし、スキップ")
+        return
+
+    #if result and result["査閲結果"] == "却下":
+    #    update_redmine_status(issue_id, 5)  # “差し戻し” のステータスIDに置き換え
+
+    result = parse_dify_result(result_text)
+    if result:
+        if isinstance(result, dict):
+            result.setdefault("LLM", DIFY_LLM)
+        else:
+            result = {"査閲結果": str(result), "理由": "", "LLM": DIFY_LLM}
+        if dify_comment:
+            result["comment"] = dify_comment
+        append_result_to_excel(issue, result)
+        if result.get("査閲結果") != "不明":
+            if TEAMS_NOTIFY_ENABLED:
+                post_to_teams(issue, result, outbox=outbox, dedup_key=f"{dedup_key}:result")
+            else:
+                logging.info(f"Teams投稿をスキップ: {result['査閲結果']} ({subject})")
+
+
+def finish_job(store, job, future):
+    """
+    完了したDify解析を記録してジョブを完了にする。ワーカーが例外で終わった場合（DifyCallError など）だけ再試行に回す。
+    有効な結果のない応答（空・数字のみなど）は再試行しても同じため、記録をスキップしてジョブを完了にする。
+    """
+    issue = job["issue"]
+    issue_id = job["issue_id"]
+    try:
+        outcome = future.result()
+    except Exception as e:
+        if not isinstance(e, DifyCallError):
+            logging.error(f"Dify解析ワーカーで例外が発生しました(#{issue_id}): {e}")
+        retry = store.fail_job(job["id"], str(e) or "Dify呼び出し失敗", max_attempts=JOB_MAX_ATTEMPTS, retry_delay=JOB_RETRY_DELAY)
+        if retry:
+            logging.warning(f"チケット #{issue_id} の解析に失敗しました。再試行します({job['attempts']}/{JOB_MAX_ATTEMPTS})")
+        else:
+            logging.error(f"チケット #{issue_id} の解析が再試行上限に達しました。")
+        return
+
+    outbox = []
+    try:
+        record_analysis(issue, job["updated_on"], outcome, outbox)
+    except Exception as e:
+        logging.error(f"解析結果の記録に失敗しました(#{issue_id}): {e}\n{traceback.format_exc()}")
+        store.fail_job(job["id"], str(e), max_attempts=JOB_MAX_ATTEMPTS, retry_delay=JOB_RETRY_DELAY)
+        return
+    store.complete_job(job["id"], notifications=outbox)
+    if outbox and outbox_sender is not None:
+        outbox_sender.wake()
+
 
+def run_jobs(store, executor, pending, deadline):
+    """
+    deadline（monotonic秒）まで、空きワーカー分のジョブを取得してDify解析を投入し、
+    完了したものを投入順に記録する。未完了分は次のポーリング後に持ち越す。
+    """
     while True:
+        while pending and pending[0][1].done():
+            finish_job(store, *pending.popleft())
+
+        running = [future for _, future in pending if not future.done()]
+        for job in store.claim_jobs(DIFY_WORKERS - len(running), JOB_VISIBILITY_TIMEOUT):
+            issue = job["issue"]
+            issue_id = issue.get("id", job["issue_id"])  # Difyには取得時と同じ型で渡す
+            logging.info(f"🆕 処理対象チケット: #{issue_id} ({issue.get('subject')}) → Dify解析開始")
+            future = executor.submit(analyze_issue, store, issue_id)
+            pending.append((job, future))
+            running.append(future)
+
+        JOBS_IN_FLIGHT.set(len(pending))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if not running:
+            time.sleep(remaining)
+            return
+        wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+
+
+# --- メインループ ---
+def main():
+    resumed = requeue_claimed_jobs(STATE_DB)
+    if resumed:
+        logging.info(f"前回処理中だった解析ジョブ{resumed}件を再開します。")
+    global outbox_sender
+    if METRICS_PORT:
         try:
-            issues = get_recent_issues()
-            for issue in issues:
-                issue_id = issue["id"]
-                subject = issue["subject"]
-
-                updated_on = normalize_timestamp(issue["updated_on"])
-                last_time = processed.get(str(issue_id))
-                if last_time == updated_on:
-                    continue  # 変更なし → Dify呼び出し不要
-
-                status_info = issue.get("status", {}) or {}
-                status_name = status_info.get("name", "")
-                # 「終了」ステータスでチケットを終了扱いとし、case_cleanerに通知する
-                status_is_closed = (status_name == "終了")
-                caseid = extract_caseid(issue)
-
-                if status_is_closed:
-                    cleaned = cleanup_case_directory(caseid, ticket_id=issue_id)
-                    if cleaned:
-                        logging.info(f"case_cleaner: チケット#{issue_id} ({subject}) のcaseidディレクトリを削除しました。")
-                    else:
-                        logging.info(f"case_cleaner: チケット#{issue_id} ({subject}) で削除対象が見つからないか失敗しました。")
-                    save_processed_issue(STATE_DB, issue_id, updated_on)
-                    processed[str(issue_id)] = updated_on
-                    continue
-
-                logging.info(f"🆕 処理対象チケット: #{issue_id} ({subject}) → Dify解析開始")
-                result_text, dify_status, dify_comment = call_dify(issue_id)
-                if dify_status == "caseid_mismatch":
-                    logging.warning(f"caseid mismatch 検知: チケット #{issue_id} ({subject})")
-                    # post_caseid_mismatch_alert(issue)
-                    processed[str(issue_id)] = updated_on
-                    save_processed_issue(STATE_DB, issue_id, updated_on)
-                    continue
-                if dify_status and dify_status != "ok":
-                    processed[str(issue_id)] = updated_on
-                    save_processed_issue(STATE_DB, issue_id, updated_on)
-                    continue
-                if not result_text:
-                    logging.info("Dify応答なし、スキップ")
-                    processed[str(issue_id)] = updated_on
-                    save_processed_issue(STATE_DB, issue_id, updated_on)
-                    continue
-
-                #if result and result["査閲結果"] == "却下":
-                #    update_redmine_status(issue_id, 5)  # “差し戻し” のステータスIDに置き換え
-
-                result = parse_dify_result(result_text)
-                if result:
-                    if isinstance(result, dict):
-                        result.setdefault("LLM", DIFY_LLM)
-                    else:
-                        result = {"査閲結果": str(result), "理由": "", "LLM": DIFY_LLM}
-                    if dify_comment:
-                        result["comment"] = dify_comment
-                    append_result_to_excel(issue, result)
-                    if result.get("査閲結果") != "不明":
-                        # post_to_teams(issue, result)
-                        logging.info(f"Teams投稿をスキップ: {result['査閲結果']} ({subject})")
-
-                # 二重処理防止のため、最新のupdated_onを状態DBへ保存
-                processed[str(issue_id)] = updated_on
-                save_processed_issue(STATE_DB, issue_id, updated_on)
-
-            # removed = prune_stale_issues(STATE_DB, max_age_days=180)
-            # if removed:
-            #     logging.info(f"STATE_DB: 180日超未更新のレコードを{removed}件削除しました。")
+            metrics.start_http_server(METRICS_PORT, METRICS_ADDR)
+        except OSError as e:
+            logging.error(f"メトリクスエンドポイントを起動できません({METRICS_ADDR}:{METRICS_PORT}): {e}")
+    store = StateStore(STATE_DB, cache_size=STATE_CACHE_SIZE)
+    outbox_sender = OutboxSender(
+        store,
+        teams_dispatcher,
+        max_attempts=TEAMS_OUTBOX_MAX_ATTEMPTS,
+        backoff_max=TEAMS_OUTBOX_BACKOFF_MAX,
+    )
+    outbox_sender.start()
+    case_cleaner.start()  # 前回停止時にゴミ箱へ残ったディレクトリの削除も再開する
+    watermark = store.load_watermark() if REDMINE_FETCH_MODE == "incremental" else None
+    executor = ThreadPoolExecutor(max_workers=DIFY_WORKERS, thread_name_prefix="dify")
+    pending = deque()  # (job, future) を投入順に保持
+    next_prune_at = time.monotonic()
 
-        except Exception as e:
-            logging.error(f"メインループエラー: {e}\n{traceback.format_exc()}")
+    try:
+        while True:
+            deadline = time.monotonic() + POLL_INTERVAL
+            cycle_started = time.perf_counter()
+            try:
+                issues, next_watermark = fetch_issues(watermark)
+                # 取得したページ全体の (issue_id, updated_on) から変更のあったものを1回の検索で絞り込む
+                pairs = [(issue["id"], normalize_timestamp(issue["updated_on"])) for issue in issues]
+                changed = set(store.filter_changed(pairs))
+                closed, jobs = [], []
+                for issue, (issue_id, updated_on) in zip(issues, pairs):
+                    if (issue_id, updated_on) not in changed:
+                        continue  # 変更なし → Dify呼び出し不要
+                    subject = issue["subject"]
+
+                    status_info = issue.get("status", {}) or {}
+                    status_name = status_info.get("name", "")
+                    # 「終了」ステータスでチケットを終了扱いとし、case_cleanerに通知する
+                    status_is_closed = (status_name == "終了")
+                    caseid = extract_caseid(issue)
+
+                    if status_is_closed:
+                        cleaned = cleanup_case_directory(caseid, ticket_id=issue_id)
+                        if cleaned:
+                            logging.info(f"case_cleaner: チケット#{issue_id} ({subject}) のcaseidディレクトリをバックグラウンド削除に回しました。")
+                        else:
+                            logging.info(f"case_cleaner: チケット#{issue_id} ({subject}) で削除対象が見つからないか失敗しました。")
+                        closed.append((issue_id, updated_on))
+                        continue
+
+                    # 解析ジョブとして登録（処理済みの記録と一緒にコミット）
+                    jobs.append((issue_id, updated_on, issue))
+
+                # 全チケットの判定後に、処理済みの記録・解析ジョブ・高水位マークを1トランザクションで書き込む
+                # （途中失敗時は高水位マークが進まず、次回同じ範囲を再取得）
+                store.record_poll(
+                    processed=closed,
+                    jobs=jobs,
+                    watermark=next_watermark if next_watermark != watermark else None,
+                )
+                CHANGED_ISSUES.inc(len(closed), action="closed")
+                CHANGED_ISSUES.inc(len(jobs), action="enqueued")
+                watermark = next_watermark or watermark
+                POLL_CYCLE_SECONDS.observe(time.perf_counter() - cycle_started)
+                job_counts = store.count_jobs()
+                for state in ("pending", "claimed", "failed"):
+                    JOBS_QUEUED.set(job_counts.get(state, 0), state=state)
+
+                if time.monotonic() >= next_prune_at:
+                    next_prune_at = time.monotonic() + STATE_PRUNE_INTERVAL
+                    if STATE_PRUNE_DAYS > 0:
+                        removed = store.prune_stale_issues(max_age_days=STATE_PRUNE_DAYS)
+                        if removed:
+                            logging.info(f"STATE_DB: {STATE_PRUNE_DAYS}日超未更新のレコードを{removed}件削除しました。")
+                    if TEAMS_OUTBOX_RETENTION_DAYS > 0:
+                        removed = store.prune_notifications(max_age_days=TEAMS_OUTBOX_RETENTION_DAYS)
+                        if removed:
+                            logging.info(f"STATE_DB: 送信を終えて{TEAMS_OUTBOX_RETENTION_DAYS}日を超えた通知を{removed}件削除しました。")
 
-        time.sleep(POLL_INTERVAL)
+            except Exception as e:
+                logging.error(f"メインループエラー: {e}\n{traceback.format_exc()}")
+
+            try:
+                run_jobs(store, executor, pending, deadline)
+            except Exception as e:
+                logging.error(f"解析ジョブ処理エラー: {e}\n{traceback.format_exc()}")
+                time.sleep(max(deadline - time.monotonic(), 0))
+            result_writer.maybe_flush()
+    finally:
+        # 実行中のDify呼び出しは待たない（結果は記録できず、ジョブは可視性タイムアウト後に再取得される）
+        executor.shutdown(wait=False, cancel_futures=True)
+        result_writer.flush()
+        outbox_sender.stop(timeout=TEAMS_TIMEOUT)
+        case_cleaner.stop(timeout=5)
+        teams_dispatcher.shutdown()
+        store.close()
 
 if __name__ == "__main__":
     signal.signal(signal.SIGTERM, handle_shutdown)
+    exit_code = 0
     try:
         main()
     except KeyboardInterrupt:
         logging.info("停止要求を受信しました。終了します。")
-        exit(0)
+        http_client.close_all()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 0
+    except Exception as e:
+        logging.critical(f"監視を継続できません: {e}\n{traceback.format_exc()}")
+        exit_code = 1
+    # 通常の終了処理はDifyワーカースレッドの完了を待つ（最大 DIFY_TIMEOUT 秒）ため、後始末を済ませた上で即座に終了する
+    logging.shutdown()
+    os._exit(exit_code)
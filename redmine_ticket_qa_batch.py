@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Redmineチケットを1行1件で保存したJSONLを読み、3つのQ&Aパーサーでまとめて判定する（オフラインでの再スクリーニング用）。
+
+    python3 redmine_ticket_qa_batch.py issues.jsonl [-o results.jsonl] [--workers 8] [--parsers qa_parser,exclude_code]
+
+入力の各行は {"issue": {...}}（/issues/<id>.json?include=journals の応答）または issue オブジェクトそのもの。
+出力は入力と同じ順に1行1件:
+    {"line": <入力の行番号>, "issue_id": <id>, "qa_parser": {...}, "segment_parser": {...}, "exclude_code": {...}}
+JSONとして読めない行は {"line": ..., "error": "..."} を出力して続行する。
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from multiprocessing import Pool
+from typing import Iterator, List, Optional, Tuple
+
+import redmine_ticket_qa_parser
+import redmine_ticket_qa_segment_parser
+import redmine_ticket_qa_segment_parser_exclude_code
+
+PARSERS = {
+    "qa_parser": redmine_ticket_qa_parser.parse_issue,
+    "segment_parser": redmine_ticket_qa_segment_parser.parse_issue,
+    "exclude_code": redmine_ticket_qa_segment_parser_exclude_code.parse_issue,
+}
+
+# ワーカープロセスごとの設定（Pool の initializer で設定する）
+_parser_names: Tuple[str, ...] = tuple(PARSERS)
+_max_tokens: Optional[int] = None
+
+
+def _init_worker(parser_names: Tuple[str, ...], max_tokens: Optional[int]) -> None:
+    global _parser_names, _max_tokens
+    _parser_names = parser_names
+    _max_tokens = max_tokens
+
+
+def process_line(item: Tuple[int, str]) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    入力1行を各パーサーで判定し、(出力1行のJSON文字列, [(パーサー名, status), ...]) を返す。
+    JSONの解釈・出力の整形もワーカー側で行い、親プロセスは書き出すだけにする。
+    """
+    lineno, line = item
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        return json.dumps({"line": lineno, "error": f"JSONとして解釈できません: {e}"}, ensure_ascii=False), [("input", "error")]
+    if not isinstance(entry, dict):
+        return json.dumps({"line": lineno, "error": "チケットのオブジェクトではありません"}, ensure_ascii=False), [("input", "error")]
+    if "issue" not in entry:
+        entry = {"issue": entry}
+
+    issue = entry["issue"] if isinstance(entry["issue"], dict) else {}
+    result = {"line": lineno, "issue_id": issue.get("id")}
+    for name in _parser_names:
+        try:
+            if name == "exclude_code":
+                result[name] = PARSERS[name](entry, _max_tokens)
+            else:
+                result[name] = PARSERS[name](entry)
+        except Exception as e:
+            result[name] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    statuses = [(name, str(result[name].get("status"))) for name in _parser_names]
+    return json.dumps(result, ensure_ascii=False, default=str), statuses
+
+
+def iter_input_lines(fh) -> Iterator[Tuple[int, str]]:
+    for lineno, line in enumerate(fh, 1):
+        if line.strip():
+            yield lineno, line
+
+
+def run(input_fh, output_fh, parser_names: Tuple[str, ...], *, workers: int = 1, max_tokens: Optional[int] = None, chunksize: int = 16) -> Counter:
+    """入力JSONLを判定して出力JSONLへ書き、パーサーごとのstatus件数を返す。workers=1 ならプロセスを起動しない。"""
+    counts: Counter = Counter()
+
+    def write(processed: Tuple[str, List[Tuple[str, str]]]) -> None:
+        out_line, statuses = processed
+        output_fh.write(out_line + "\n")
+        counts.update(statuses)
+
+    lines = iter_input_lines(input_fh)
+    if workers <= 1:
+        _init_worker(parser_names, max_tokens)
+        for item in lines:
+            write(process_line(item))
+        return counts
+
+    with Pool(workers, initializer=_init_worker, initargs=(parser_names, max_tokens)) as pool:
+        for processed in pool.imap(process_line, lines, chunksize=chunksize):
+            write(processed)
+    return counts
+
+
+def cli(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Redmineチケット(JSONL)をQ&Aパーサーで一括判定する")
+    ap.add_argument("input", help="チケットのJSONL（- で標準入力）")
+    ap.add_argument("-o", "--output", default="-", help="結果のJSONL（既定: 標準出力）")
+    ap.add_argument("--parsers", default=",".join(PARSERS), help=f"実行するパーサー（カンマ区切り: {', '.join(PARSERS)}）")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ワーカープロセス数（1でプロセスを使わない）")
+    ap.add_argument("--chunksize", type=int, default=16, help="ワーカーへまとめて渡す行数")
+    ap.add_argument("--max-tokens", type=int, default=None, help="exclude_code をトークン予算モードで実行する場合の上限")
+    args = ap.parse_args(argv)
+
+    parser_names = tuple(name.strip() for name in args.parsers.split(",") if name.strip())
+    unknown = [name for name in parser_names if name not in PARSERS]
+    if unknown or not parser_names:
+        ap.error(f"不明なパーサー: {', '.join(unknown) or '(なし)'}")
+
+    input_fh = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_fh = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        counts = run(input_fh, output_fh, parser_names, workers=args.workers, max_tokens=args.max_tokens, chunksize=max(1, args.chunksize))
+    finally:
+        if input_fh is not sys.stdin:
+            input_fh.close()
+        if output_fh is not sys.stdout:
+            output_fh.close()
+
+    for (name, status), count in sorted(counts.items()):
+        print(f"{name}\t{status}\t{count}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -21,6 +21,172 @@ def _normalize_entries(inputs: Any) -> Iterable[dict]:
     return ()
 
 
+_KEYWORD_QUESTION = "Question"
+_KEYWORD_ANSWER = "Answer"
+_SEPARATOR = "-------------------------------------------"
+_CASEID_PATTERN = re.compile(r"\d{10}")
+
+
+def _extract_after_last_separator(text: Any, strip_tokens: Sequence[str] = ("<pre>", "</pre>")) -> str:
+    """strip_tokens（<pre>タグなど）を除去し、最後の区切り線以降の本文を抽出する。"""
+    if not text:
+        return ""
+    clean = str(text)
+    for token in strip_tokens:
+        clean = clean.replace(token, "")
+    clean = clean.strip()
+    if _SEPARATOR in clean:
+        clean = clean.split(_SEPARATOR)[-1]
+    return clean.strip()
+
+
+def _scan_journals(journals: Sequence[dict]) -> dict:
+    """
+    journals（時系列順）を1回だけ走査し、質問・回答を分類する。
+    Difyのコードノードは単体で動かす必要があるため、各パーサーに同じ実装を持たせている。
+
+    戻り値:
+    {
+      "records": [{"index", "created_on", "is_question", "is_answer", "notes"}, ...],  # 質問・回答のjournalのみ
+      "last_answer": <最後の回答のrecord または None>,
+      "previous_question": <最後の回答より前で最も近い質問のrecord または None>,
+      "question_after_answer": <最後の回答より後に質問があるか>
+    }
+    """
+    records = []
+    last_answer = None
+    previous_question = None
+    last_question = None
+    question_after_answer = False
+
+    for index, journal in enumerate(journals):
+        notes = journal.get("notes") or ""
+        if type(notes) is not str:
+            notes = str(notes)
+        is_question = _KEYWORD_QUESTION in notes
+        is_answer = _KEYWORD_ANSWER in notes
+        if not (is_question or is_answer):
+            continue
+
+        # 本文の抽出（区切り線・タグ除去）は呼び出し側で必要なrecordに対してのみ行う
+        record = {
+            "index": index,
+            "created_on": journal.get("created_on", ""),
+            "is_question": is_question,
+            "is_answer": is_answer,
+            "notes": notes,
+        }
+        records.append(record)
+
+        if is_answer:
+            last_answer = record
+            previous_question = last_question  # 同じjournal内の質問は直前の質問として扱わない
+            question_after_answer = False
+        if is_question:
+            last_question = record
+            if last_answer is not None and last_answer is not record:
+                question_after_answer = True
+
+    return {
+        "records": records,
+        "last_answer": last_answer,
+        "previous_question": previous_question,
+        "question_after_answer": question_after_answer,
+    }
+
+
+def parse_issue(entry: dict) -> dict:
+    """1件のチケット（{"issue": {...}}）を解析する。出力・statusは main() と同じ。"""
+    issue = entry.get("issue", {}) if isinstance(entry, dict) else {}
+    journals = issue.get("journals", []) if isinstance(issue, dict) else []
+    description = issue.get("description", "") or ""
+
+    # ---- journalsを作成日時で昇順ソート（時系列乱れ対策） ----
+    try:
+        journals = sorted(journals, key=lambda x: x.get("created_on", ""))
+    except Exception:
+        pass
+
+    # ==== 質問・回答ペアの特定（journalsを1回だけ走査） ====
+    scan = _scan_journals(journals)
+
+    # ---- ① 最後の回答（Answer）を抽出 ----
+    if scan["last_answer"] is None:
+        return {
+            "last_answer": "",
+            "previous_question": "",
+            "status": "no_answer_found"
+        }
+    last_answer = _extract_after_last_separator(scan["last_answer"]["notes"])
+
+    # ---- ② 回答後に新しい質問があり、対応回答がない場合 → unanswered_new_question ----
+    if scan["question_after_answer"]:
+        return {
+            "last_answer": "",
+            "previous_question": "",
+            "status": "unanswered_new_question"
+        }
+
+    # ---- ③ 回答直前の質問を探索 ----
+    previous_question = _extract_after_last_separator(scan["previous_question"]["notes"]) if scan["previous_question"] else None
+    if previous_question is None and _KEYWORD_QUESTION in str(description):
+        previous_question = _extract_after_last_separator(description)
+    previous_question = previous_question or ""
+
+    # ==== caseid 整合性チェック ====
+
+    # ---- ④ custom_fields から caseid を取得 ----
+    caseid = None
+    for cf in issue.get("custom_fields", []):
+        if cf.get("name") == "caseid":
+            caseid = str(cf.get("value", "")).strip()
+            break
+
+    if not caseid:
+        return {
+            "last_answer": "",
+            "previous_question": "",
+            "status": "caseid_field_missing"
+        }
+
+    # ---- ⑤ 回答冒頭3行以内から10桁数字(caseid候補群)を抽出 ----
+    lines = str(last_answer).strip().splitlines()
+    first3 = "\n".join(lines[:3])
+    found_caseids = _CASEID_PATTERN.findall(first3)
+
+    if not found_caseids:
+        # 数字が1つもない → caseid未記載（内部メモなど）
+        return {
+            "last_answer": last_answer,
+            "previous_question": previous_question,
+            "status": "caseid_missing"
+        }
+
+    # ---- ⑥ 自分のcaseidが含まれているか確認 ----
+    if caseid not in found_caseids:
+        # 他番号のみ → 誤送信の可能性
+        return {
+            "last_answer": "",
+            "previous_question": "",
+            "status": "caseid_mismatch"
+        }
+
+    # ---- ⑦ 質問または回答が欠落している場合 ----
+    if not last_answer or not previous_question:
+        return {
+            "last_answer": "",
+            "previous_question": "",
+            "status": "incomplete"
+        }
+
+    # ---- ⑧ 正常終了 ----
+    return {
+        "last_answer": last_answer,
+        "previous_question": previous_question,
+        "status": "ok"
+    }
+
+
 def main(inputs: Any) -> dict:
     """
     RedmineチケットJSONから質問（Question）と回答（Answer）を抽出する。
@@ -54,125 +220,8 @@ def main(inputs: Any) -> dict:
         caseid_mismatch         : 回答冒頭に10桁数字はあるが、自分のcaseidが含まれない（誤送信の可能性）
     """
 
-    keyword_answer = "Answer"
-    keyword_question = "Question"
-    separator = "-------------------------------------------"
-
-    def extract_after_last_separator(text) -> str:
-        """<pre>タグを除去し、最後の区切り線以降の本文を抽出"""
-        if text is None:
-            return ""
-        clean = str(text).replace("<pre>", "").replace("</pre>", "").strip()
-        if separator in clean:
-            clean = clean.split(separator)[-1]
-        return clean.strip()
-
     for entry in _normalize_entries(inputs):
-        issue = entry.get("issue", {}) if isinstance(entry, dict) else {}
-        journals = issue.get("journals", []) if isinstance(issue, dict) else []
-        description = issue.get("description", "") or ""
-        last_answer_index = None
-        last_answer = ""
-        previous_question = None
-
-        # ---- journalsを作成日時で昇順ソート（時系列乱れ対策） ----
-        try:
-            journals = sorted(journals, key=lambda x: x.get("created_on", ""))
-        except Exception:
-            pass
-
-        # ==== 質問・回答ペアの特定 ====
-
-        # ---- ① 最後の回答（Answer）を抽出 ----
-        for i, journal in enumerate(journals):
-            notes = journal.get("notes", "") or ""
-            if keyword_answer in str(notes):
-                last_answer_index = i
-                last_answer = extract_after_last_separator(notes)
-
-        if last_answer_index is None:
-            return {
-                "last_answer": "",
-                "previous_question": "",
-                "status": "no_answer_found"
-            }
-
-        # ---- ② 回答後に新しい質問があり、対応回答がない場合 → unanswered_new_question ----
-        for j in range(last_answer_index + 1, len(journals)):
-            notes = journals[j].get("notes", "") or ""
-            if keyword_question in str(notes):
-                has_following_answer = any(
-                    keyword_answer in str(k.get("notes", "")) for k in journals[j + 1:]
-                )
-                if not has_following_answer:
-                    return {
-                        "last_answer": "",
-                        "previous_question": "",
-                        "status": "unanswered_new_question"
-                    }
-
-        # ---- ③ 回答直前の質問を探索 ----
-        for j in range(last_answer_index - 1, -1, -1):
-            notes = journals[j].get("notes", "") or ""
-            if keyword_question in str(notes):
-                previous_question = extract_after_last_separator(notes)
-                break
-        if previous_question is None and keyword_question in str(description):
-            previous_question = extract_after_last_separator(description)
-        previous_question = previous_question or ""
-
-        # ==== caseid 整合性チェック ====
-
-        # ---- ④ custom_fields から caseid を取得 ----
-        caseid = None
-        for cf in issue.get("custom_fields", []):
-            if cf.get("name") == "caseid":
-                caseid = str(cf.get("value", "")).strip()
-                break
-
-        if not caseid:
-            return {
-                "last_answer": "",
-                "previous_question": "",
-                "status": "caseid_field_missing"
-            }
-
-        # ---- ⑤ 回答冒頭3行以内から10桁数字(caseid候補群)を抽出 ----
-        lines = str(last_answer).strip().splitlines()
-        first3 = "\n".join(lines[:3])
-        found_caseids = re.findall(r"\d{10}", first3)
-
-        if not found_caseids:
-            # 数字が1つもない → caseid未記載（内部メモなど）
-            return {
-                "last_answer": last_answer,
-                "previous_question": previous_question,
-                "status": "caseid_missing"
-            }
-
-        # ---- ⑥ 自分のcaseidが含まれているか確認 ----
-        if caseid not in found_caseids:
-            # 他番号のみ → 誤送信の可能性
-            return {
-                "last_answer": "",
-                "previous_question": "",
-                "status": "caseid_mismatch"
-            }
-
-        # ---- ⑦ 質問または回答が欠落している場合 ----
-        if not last_answer or not previous_question:
-            return {
-                "last_answer": "",
-                "previous_question": "",
-                "status": "incomplete"
-            }
-
-        # ---- ⑧ 正常終了 ----
-        return {
-            "last_answer": last_answer,
-            "previous_question": previous_question,
-            "status": "ok"
-        }
+        return parse_issue(entry)
 
     # ---- 入力データなし ----
     return {
@@ -180,3 +229,11 @@ def main(inputs: Any) -> dict:
         "previous_question": "",
         "status": "incomplete"
     }
+
+
+def main_batch(inputs: Any) -> dict:
+    """
+    入力に含まれる全チケットを解析する（main() は先頭の1件のみ）。
+    出力: {"results": [<main() と同じ形式の結果>, ...]}  # 入力順・1チケット1件
+    """
+    return {"results": [parse_issue(entry) for entry in _normalize_entries(inputs)]}
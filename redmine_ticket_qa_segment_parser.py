@@ -21,6 +21,174 @@ def _normalize_entries(inputs: Any) -> Iterable[dict]:
     return ()
 
 
+_KEYWORD_QUESTION = "Question"
+_KEYWORD_ANSWER = "Answer"
+_SEPARATOR = "-------------------------------------------"
+
+
+def _extract_after_last_separator(text: Any, strip_tokens: Sequence[str] = ("<pre>", "</pre>")) -> str:
+    """strip_tokens（<pre>タグなど）を除去し、最後の区切り線以降の本文を抽出する。"""
+    if not text:
+        return ""
+    clean = str(text)
+    for token in strip_tokens:
+        clean = clean.replace(token, "")
+    clean = clean.strip()
+    if _SEPARATOR in clean:
+        clean = clean.split(_SEPARATOR)[-1]
+    return clean.strip()
+
+
+def _scan_journals(journals: Sequence[dict]) -> dict:
+    """
+    journals（時系列順）を1回だけ走査し、質問・回答を分類する。
+    Difyのコードノードは単体で動かす必要があるため、各パーサーに同じ実装を持たせている。
+
+    戻り値:
+    {
+      "records": [{"index", "created_on", "is_question", "is_answer", "notes"}, ...],  # 質問・回答のjournalのみ
+      "last_answer": <最後の回答のrecord または None>,
+      "previous_question": <最後の回答より前で最も近い質問のrecord または None>,
+      "question_after_answer": <最後の回答より後に質問があるか>
+    }
+    """
+    records = []
+    last_answer = None
+    previous_question = None
+    last_question = None
+    question_after_answer = False
+
+    for index, journal in enumerate(journals):
+        notes = journal.get("notes") or ""
+        if type(notes) is not str:
+            notes = str(notes)
+        is_question = _KEYWORD_QUESTION in notes
+        is_answer = _KEYWORD_ANSWER in notes
+        if not (is_question or is_answer):
+            continue
+
+        # 本文の抽出（区切り線・タグ除去）は呼び出し側で必要なrecordに対してのみ行う
+        record = {
+            "index": index,
+            "created_on": journal.get("created_on", ""),
+            "is_question": is_question,
+            "is_answer": is_answer,
+            "notes": notes,
+        }
+        records.append(record)
+
+        if is_answer:
+            last_answer = record
+            previous_question = last_question  # 同じjournal内の質問は直前の質問として扱わない
+            question_after_answer = False
+        if is_question:
+            last_question = record
+            if last_answer is not None and last_answer is not record:
+                question_after_answer = True
+
+    return {
+        "records": records,
+        "last_answer": last_answer,
+        "previous_question": previous_question,
+        "question_after_answer": question_after_answer,
+    }
+
+
+_STRIP_TOKENS = ("<pre>", "</pre>", "```")
+_MAX_ENTRIES = 10       # トークン削減用：履歴の最大件数
+_MAX_TEXT_LENGTH = 500  # 要約対象の閾値
+# str.splitlines() が区切りとみなす \n 以外の改行。含まれる場合のみ \n に揃える（文字クラスでの全文検索は遅いため in で判定）
+_EXTRA_LINE_BREAKS = ("\r", "\v", "\f", "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029")
+_LINE_BREAK_PATTERN = re.compile(r"\r\n?|[\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# 削除する行を直前の改行ごと1つのパターンで表す。先頭が固定文字（\n）のため、reは行頭だけを探して照合する
+_LOG_LINE_PATTERN = re.compile(
+    r"\n[^\S\n]*(?:"
+    r"(?:\d{4}-\d{2}-\d{2}|\d{2}:\d{2}:\d{2}|INFO|ERROR|DEBUG|TRACE)[^\n]*"  # syslog / timestamp / log level
+    r"|[{\[][^\n]*[}\]][^\S\n]*$"  # JSONやコードブロックっぽい行
+    r"|\S[^\n]{200,}(?<=\S)[^\S\n]*$"  # 前後の空白を除いて200文字を超える行（バイナリorスタックトレース）
+    r")",
+    re.MULTILINE,
+)
+
+
+def _remove_logs(text: str) -> str:
+    """
+    syslogやコードブロックのようなログ行を削除・置換。
+    - 長い数字や日付時刻が並ぶ行
+    - "ERROR", "INFO", "DEBUG"を含む行
+    - { }, [] によるJSON風データ
+    - 多行コードブロック ```～```
+    行に分割せず、_LOG_LINE_PATTERN で該当行を本文から直接取り除く。
+    """
+    if not text:
+        return ""
+    if any(ch in text for ch in _EXTRA_LINE_BREAKS):
+        text = _LINE_BREAK_PATTERN.sub("\n", text)
+    cleaned = _LOG_LINE_PATTERN.sub("", "\n" + text).strip()  # 1行目も「改行+行」として照合する
+
+    # 残骸が空になった場合は「ログ省略」と明記
+    return cleaned if cleaned else "[ログ省略]"
+
+
+def _summarize_text(text: str) -> str:
+    """長文を簡易要約して圧縮"""
+    if not text:
+        return ""
+    text = _remove_logs(text)
+    if len(text) <= _MAX_TEXT_LENGTH:
+        return text
+    head = text[:200].strip()
+    tail = text[-100:].strip()
+    return f"{head}\n…（中略）…\n{tail}"
+
+
+def parse_issue(entry: dict) -> dict:
+    """1件のチケット（{"issue": {...}}）から質問・回答の履歴を抽出する。出力は main() と同じ。"""
+    issue = entry.get("issue", {}) if isinstance(entry, dict) else {}
+    journals = issue.get("journals", []) if isinstance(issue, dict) else []
+    description = issue.get("description", "") or ""
+    issue_created = issue.get("created_on", "")
+    all_entries = []
+
+    # ---- descriptionを質問として先頭に追加（あれば）----
+    if _KEYWORD_QUESTION in str(description):
+        text = _extract_after_last_separator(description, _STRIP_TOKENS)
+        if text:
+            all_entries.append({
+                "type": "question",
+                "text": _summarize_text(text),
+                "created_on": issue_created
+            })
+
+    # ---- journalsを時系列順にソート ----
+    try:
+        journals = sorted(journals, key=lambda x: x.get("created_on", ""))
+    except Exception:
+        pass
+
+    # ---- journalsから質問・回答を抽出（1回の走査で分類済み）----
+    for record in _scan_journals(journals)["records"]:
+        text = _extract_after_last_separator(record["notes"], _STRIP_TOKENS)
+        if not text:
+            continue
+        all_entries.append({
+            "type": "question" if record["is_question"] else "answer",
+            "text": _summarize_text(text),
+            "created_on": record["created_on"]
+        })
+
+    # ---- 長すぎる場合は直近 _MAX_ENTRIES 件のみ保持 ----
+    if len(all_entries) > _MAX_ENTRIES:
+        all_entries = all_entries[-_MAX_ENTRIES:]
+
+    status = "ok" if all_entries else "incomplete"
+
+    return {
+        "entries": all_entries,
+        "status": status
+    }
+
+
 def main(inputs: Any):
     """
     RedmineチケットJSONから、質問・回答の履歴を時系列順に抽出する。
@@ -37,127 +205,18 @@ def main(inputs: Any):
     }
     """
 
-    keyword_question = "Question"
-    keyword_answer = "Answer"
-    separator = "-------------------------------------------"
-    MAX_ENTRIES = 10       # トークン削減用：履歴の最大件数
-    MAX_TEXT_LENGTH = 500  # 要約対象の閾値
-
-    def extract_after_last_separator(text: str) -> str:
-        """<pre>や```を除去し、最後の区切り線以降を抽出"""
-        if not text:
-            return ""
-        clean = (
-            str(text)
-            .replace("<pre>", "")
-            .replace("</pre>", "")
-            .replace("```", "")
-            .strip()
-        )
-        if separator in clean:
-            clean = clean.split(separator)[-1]
-        return clean.strip()
-
-    def remove_logs(text: str) -> str:
-        """
-        syslogやコードブロックのようなログ行を削除・置換。
-        - 長い数字や日付時刻が並ぶ行
-        - "ERROR", "INFO", "DEBUG"を含む行
-        - { }, [] によるJSON風データ
-        - 多行コードブロック ```～```
-        """
-        if not text:
-            return ""
-        lines = text.splitlines()
-        filtered = []
-        for line in lines:
-            # syslog / timestamp / log level
-            if re.match(r"^\s*(\d{4}-\d{2}-\d{2}|\d{2}:\d{2}:\d{2}|INFO|ERROR|DEBUG|TRACE)", line):
-                continue
-            # JSONやコードブロックっぽい
-            if re.match(r"^\s*[{\[].*[}\]]\s*$", line):
-                continue
-            if len(line.strip()) > 200:
-                # 1行が非常に長い場合（バイナリorスタックトレース）
-                continue
-            filtered.append(line)
-        cleaned = "\n".join(filtered).strip()
-
-        # 残骸が空になった場合は「ログ省略」と明記
-        return cleaned if cleaned else "[ログ省略]"
-
-    def summarize_text(text: str) -> str:
-        """長文を簡易要約して圧縮"""
-        if not text:
-            return ""
-        text = remove_logs(text)
-        if len(text) <= MAX_TEXT_LENGTH:
-            return text
-        head = text[:200].strip()
-        tail = text[-100:].strip()
-        return f"{head}\n…（中略）…\n{tail}"
-
-    all_entries = []
-
     for entry in _normalize_entries(inputs):
-        issue = entry.get("issue", {}) if isinstance(entry, dict) else {}
-        journals = issue.get("journals", []) if isinstance(issue, dict) else []
-        description = issue.get("description", "") or ""
-        issue_created = issue.get("created_on", "")
-
-        # ---- descriptionを質問として先頭に追加（あれば）----
-        if keyword_question in str(description):
-            text = extract_after_last_separator(description)
-            if text:
-                all_entries.append({
-                    "type": "question",
-                    "text": summarize_text(text),
-                    "created_on": issue_created
-                })
-
-        # ---- journalsを時系列順にソート ----
-        try:
-            journals = sorted(journals, key=lambda x: x.get("created_on", ""))
-        except Exception:
-            pass
-
-        # ---- journalsから質問・回答を抽出 ----
-        for j in journals:
-            notes = str(j.get("notes", "")) or ""
-            created_on = j.get("created_on", "")
-            if not notes.strip():
-                continue  # 空ノート・内部メモはスキップ
-
-            if keyword_question in notes:
-                q_text = extract_after_last_separator(notes)
-                if q_text:
-                    all_entries.append({
-                        "type": "question",
-                        "text": summarize_text(q_text),
-                        "created_on": created_on
-                    })
-
-            elif keyword_answer in notes:
-                a_text = extract_after_last_separator(notes)
-                if a_text:
-                    all_entries.append({
-                        "type": "answer",
-                        "text": summarize_text(a_text),
-                        "created_on": created_on
-                    })
-
-        # ---- 長すぎる場合は直近 MAX_ENTRIES 件のみ保持 ----
-        if len(all_entries) > MAX_ENTRIES:
-            all_entries = all_entries[-MAX_ENTRIES:]
-
-        status = "ok" if all_entries else "incomplete"
-
-        return {
-            "entries": all_entries,
-            "status": status
-        }
+        return parse_issue(entry)
 
     return {
         "entries": [],
         "status": "incomplete"
     }
+
+
+def main_batch(inputs: Any) -> dict:
+    """
+    入力に含まれる全チケットを解析する（main() は先頭の1件のみ）。
+    出力: {"results": [<main() と同じ形式の結果>, ...]}  # 入力順・1チケット1件
+    """
+    return {"results": [parse_issue(entry) for entry in _normalize_entries(inputs)]}
@@ -1,4 +1,5 @@
-from typing import Any, Iterable, Sequence, List
+from typing import Any, Callable, Iterable, Sequence, List, Optional
+import math
 import re
 
 
@@ -16,18 +17,348 @@ def _normalize_entries(inputs: Any) -> Iterable[dict]:
     return ()
 
 
-def main(inputs: Any):
+_KEYWORD_QUESTION = "Question"
+_KEYWORD_ANSWER = "Answer"
+_SEPARATOR = "-------------------------------------------"
+_CASEID_PATTERN = re.compile(r"\d{10}")
+
+
+def _extract_after_last_separator(text: Any, strip_tokens: Sequence[str] = ("<pre>", "</pre>")) -> str:
+    """strip_tokens（<pre>タグなど）を除去し、最後の区切り線以降の本文を抽出する。"""
+    if not text:
+        return ""
+    clean = str(text)
+    for token in strip_tokens:
+        clean = clean.replace(token, "")
+    clean = clean.strip()
+    if _SEPARATOR in clean:
+        clean = clean.split(_SEPARATOR)[-1]
+    return clean.strip()
+
+
+def _scan_journals(journals: Sequence[dict]) -> dict:
+    """
+    journals（時系列順）を1回だけ走査し、質問・回答を分類する。
+    Difyのコードノードは単体で動かす必要があるため、各パーサーに同じ実装を持たせている。
+
+    戻り値:
+    {
+      "records": [{"index", "created_on", "is_question", "is_answer", "notes"}, ...],  # 質問・回答のjournalのみ
+      "last_answer": <最後の回答のrecord または None>,
+      "previous_question": <最後の回答より前で最も近い質問のrecord または None>,
+      "question_after_answer": <最後の回答より後に質問があるか>
+    }
+    """
+    records = []
+    last_answer = None
+    previous_question = None
+    last_question = None
+    question_after_answer = False
+
+    for index, journal in enumerate(journals):
+        notes = journal.get("notes") or ""
+        if type(notes) is not str:
+            notes = str(notes)
+        is_question = _KEYWORD_QUESTION in notes
+        is_answer = _KEYWORD_ANSWER in notes
+        if not (is_question or is_answer):
+            continue
+
+        # 本文の抽出（区切り線・タグ除去）は呼び出し側で必要なrecordに対してのみ行う
+        record = {
+            "index": index,
+            "created_on": journal.get("created_on", ""),
+            "is_question": is_question,
+            "is_answer": is_answer,
+            "notes": notes,
+        }
+        records.append(record)
+
+        if is_answer:
+            last_answer = record
+            previous_question = last_question  # 同じjournal内の質問は直前の質問として扱わない
+            question_after_answer = False
+        if is_question:
+            last_question = record
+            if last_answer is not None and last_answer is not record:
+                question_after_answer = True
+
+    return {
+        "records": records,
+        "last_answer": last_answer,
+        "previous_question": previous_question,
+        "question_after_answer": question_after_answer,
+    }
+
+
+# トークン数の推定（tokenizer を持たないDifyのコードノード用の目安）
+# ASCII は英単語・記号がまとまって約4文字で1トークン、かな・漢字など非ASCIIは1文字でほぼ1トークンになる
+_ASCII_CHARS_PER_TOKEN = 4.0
+_NON_ASCII_TOKENS_PER_CHAR = 1.0
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    UTF-8のバイト数と文字数の差から非ASCII文字数を見積もり、トークン数を推定する。
+    3バイト文字（かな・漢字）は1文字で+2バイトになるため、(バイト数-文字数)/2 を非ASCII文字数とみなす。
+    """
+    if not text:
+        return 0
+    chars = len(text)
+    non_ascii = min(chars, (len(text.encode("utf-8", "surrogatepass")) - chars) / 2)
+    ascii_chars = chars - non_ascii
+    return math.ceil(ascii_chars / _ASCII_CHARS_PER_TOKEN + non_ascii * _NON_ASCII_TOKENS_PER_CHAR)
+
+
+_STRIP_TOKENS = ("<pre>", "</pre>", "```")
+_MAX_TOTAL_CHARS = 6000  # ← 全履歴の合計文字数上限
+# str.splitlines() が区切りとみなす \n 以外の改行。含まれる場合のみ \n に揃える（文字クラスでの全文検索は遅いため in で判定）
+_EXTRA_LINE_BREAKS = ("\r", "\v", "\f", "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029")
+_LINE_BREAK_PATTERN = re.compile(r"\r\n?|[\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# 削除する行を直前の改行ごと1つのパターンで表す。先頭が固定文字（\n）のため、reは行頭だけを探して照合する
+_LOG_LINE_PATTERN = re.compile(
+    r"\n[^\S\n]*(?:"
+    r"(?:\d{4}-\d{2}-\d{2}|\d{2}:\d{2}:\d{2}|INFO|ERROR|DEBUG|TRACE)[^\n]*"  # syslog / timestamp / log level
+    r"|[{\[][^\n]*[}\]][^\S\n]*$"  # JSONやコードブロックっぽい行
+    r"|\S[^\n]{200,}(?<=\S)[^\S\n]*$"  # 前後の空白を除いて200文字を超える行（バイナリorスタックトレース）
+    r")",
+    re.MULTILINE,
+)
+
+
+def _remove_logs(text: str) -> str:
+    """syslog形式、長すぎる行、JSONなどの行を _LOG_LINE_PATTERN で本文から直接取り除く（行に分割しない）。"""
+    if not text:
+        return ""
+    if any(ch in text for ch in _EXTRA_LINE_BREAKS):
+        text = _LINE_BREAK_PATTERN.sub("\n", text)
+    cleaned = _LOG_LINE_PATTERN.sub("", "\n" + text).strip()  # 1行目も「改行+行」として照合する
+    return cleaned if cleaned else "[ログ省略]"
+
+
+# コードブロック・<pre>/<code>領域・スタックトレースを1回の走査で塊（span）として検出する。
+# 行頭で始まるものは直前の改行から照合し、各候補の先頭を固定文字（\n か <）にしてreが候補位置だけを探すようにする
+_STACK_FRAME = r"(?:at [^\s(]+\([^\n]*|\.\.\. \d+ (?:more|common frames omitted)[ \t]*(?=\n|\Z))"
+_CODE_SPAN_PATTERN = re.compile(
+    r"\n[ \t]*(?P<marker>`{3,}|~{3,})(?P<lang>[^`\n]*)(?=\n|\Z)(?P<fence_body>.*?)\n[ \t]*(?P=marker)[ \t]*(?=\n|\Z)"
+    r"|<(?i:pre)\b[^>]*>(?P<pre_body>.*?)</(?i:pre)>"  # 閉じていないフェンス・<pre>/<code> は span とみなさない
+    r"|<(?i:code)\b[^>]*>(?P<code_body>.*?)</(?i:code)>"
+    r"|\n[ \t]*" + _STACK_FRAME + r"(?:\n[ \t]*" + _STACK_FRAME + r")+"  # Java / .NET のスタックトレース
+    r"|\nTraceback \(most recent call last\):[ \t]*(?:\n[ \t]+[^\n]*)*",  # Python のトレースバック
+    re.DOTALL,
+)
+_FIRST_FRAME_PATTERN = re.compile(r"^[ \t]*(?:at [^\s(]+\([^\n]*|File \"[^\"\n]*\", line \d+[^\n]*)", re.MULTILINE)
+_PLACEHOLDER_FRAME_CHARS = 120  # プレースホルダに残す先頭フレームの最大文字数
+
+
+def _code_span_placeholder(match: "re.Match") -> str:
+    """
+    検出した span を「【コード省略: N行 (言語)】」「【スタックトレース省略: N行, 先頭: <最初のフレーム>】」に置き換える。
+    中身が1行以下のコードは本文の一部とみなし、タグ・フェンスだけ外して残す。
+    <pre>/<code> の中に区切り線や Question/Answer があれば、ノート全体を囲んだものとみなしてそのまま残す。
+    _remove_logs() に JSON 風の行として消されないよう、全角の括弧で囲む。
+    """
+    span = match.group(0)
+    leading = "\n" if span.startswith("\n") else ""  # 行頭の span は直前の改行から照合している
+    body = next((b for b in (match.group("fence_body"), match.group("pre_body"), match.group("code_body")) if b is not None), None)
+    is_trace = body is None
+    if is_trace:
+        body = span
+    elif match.group("marker") is None and (
+        _SEPARATOR in body or _KEYWORD_QUESTION in body or _KEYWORD_ANSWER in body
+    ):
+        return span
+    lines = [line for line in body.splitlines() if line.strip()]
+    if not is_trace and len(lines) <= 1:
+        return leading + (lines[0].strip() if lines else "")
+
+    frame = _FIRST_FRAME_PATTERN.search(body)
+    if is_trace or frame:
+        first_frame = f", 先頭: {frame.group(0).strip()[:_PLACEHOLDER_FRAME_CHARS]}" if frame else ""
+        return f"{leading}【スタックトレース省略: {len(lines)}行{first_frame}】"
+    lang = (match.group("lang") or "").strip()
+    return f"{leading}【コード省略: {len(lines)}行{f' ({lang})' if lang else ''}】"
+
+
+def _compact_code_spans(text: str) -> str:
+    """
+    コードブロック・<pre>/<code>領域・スタックトレースを塊ごとに短いプレースホルダへ置き換える。
+    区切り線以降の本文（_extract_after_text()）に対して使い、ノート全体を囲む <pre> などを畳まないようにする。
+    """
+    if not text:
+        return ""
+    return _CODE_SPAN_PATTERN.sub(_code_span_placeholder, "\n" + text)[1:]  # 1行目も「改行+行」として照合する
+
+
+def _extract_after_text(text: Any) -> str:
+    """区切り線以降の本文を、タグ・フェンスを残したまま取り出す（_compact_code_spans() の入力用）。"""
+    return _extract_after_last_separator(text, ())
+
+
+def _trim_entries_by_chars(entries: List[dict]) -> List[dict]:
+    total_chars = 0
+    trimmed = []
+    for entry in reversed(entries):
+        text = entry.get("text", "") or ""
+        entry_len = len(text)
+        remaining = _MAX_TOTAL_CHARS - total_chars
+        if remaining <= 0:
+            break
+        if entry_len == 0:
+            trimmed.append(entry)
+            continue
+        if entry_len > remaining:
+            truncated = dict(entry)
+            truncated["text"] = text[:remaining]
+            trimmed.append(truncated)
+            total_chars = _MAX_TOTAL_CHARS
+            break
+        trimmed.append(entry)
+        total_chars += entry_len
+    return list(reversed(trimmed))
+
+
+def _trim_entries_by_tokens(entries: List[dict], limit: int, estimate: Callable[[str], int]) -> List[dict]:
+    """直近の entries から推定トークン数の合計が limit 以内になるまで詰める。"""
+    total_tokens = 0
+    trimmed = []
+    for entry in reversed(entries):
+        remaining = limit - total_tokens
+        if remaining <= 0:
+            break
+        text = entry.get("text", "") or ""
+        entry_tokens = estimate(text)
+        if entry_tokens > remaining:
+            # 収まる最長の先頭部分を二分探索で求める（推定値は文字数に対して単調とみなす）
+            low, high = 0, len(text)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if estimate(text[:mid]) <= remaining:
+                    low = mid
+                else:
+                    high = mid - 1
+            if low:
+                truncated = dict(entry)
+                truncated["text"] = text[:low]
+                trimmed.append(truncated)
+            break
+        trimmed.append(entry)
+        total_tokens += entry_tokens
+    return list(reversed(trimmed))
+
+
+def parse_issue(entry: dict, max_tokens: Optional[int] = None, token_estimator: Optional[Callable[[str], int]] = None) -> dict:
+    """1件のチケット（{"issue": {...}}）を解析する。引数・出力は main() と同じ。"""
+    issue = entry.get("issue", {}) if isinstance(entry, dict) else {}
+    journals = issue.get("journals", []) if isinstance(issue, dict) else []
+    description = issue.get("description", "") or ""
+    issue_created = issue.get("created_on", "")
+    estimate = token_estimator or _estimate_tokens
+
+    # ---- 履歴一覧を構築（ログ除外・コードブロック／スタックトレースはプレースホルダに置換）----
+    all_entries = []
+    if _KEYWORD_QUESTION in str(description):
+        desc_text = _extract_after_last_separator(_compact_code_spans(_extract_after_text(description)), _STRIP_TOKENS)
+        if desc_text:
+            all_entries.append({
+                "type": "question",
+                "text": _remove_logs(desc_text),
+                "created_on": issue_created
+            })
+
+    try:
+        journals = sorted(journals, key=lambda x: x.get("created_on", ""))
+    except Exception:
+        pass
+
+    # ---- journalsを1回だけ走査して質問・回答を分類 ----
+    scan = _scan_journals(journals)
+    texts = {}
+    for record in scan["records"]:
+        raw = _extract_after_last_separator(record["notes"], _STRIP_TOKENS)
+        texts[record["index"]] = raw
+        if not raw:
+            continue
+        # ステータス判定（caseid）は元の本文で行い、履歴にはコード・トレースを畳んだ本文を渡す
+        text = _remove_logs(_extract_after_last_separator(_compact_code_spans(_extract_after_text(record["notes"])), _STRIP_TOKENS))
+        for entry_type, flag in (("question", "is_question"), ("answer", "is_answer")):
+            if record[flag]:
+                all_entries.append({
+                    "type": entry_type,
+                    "text": text,
+                    "created_on": record["created_on"]
+                })
+
+    last_answer_raw = texts[scan["last_answer"]["index"]] if scan["last_answer"] else ""
+    previous_question_raw = texts[scan["previous_question"]["index"]] if scan["previous_question"] else ""
+    if not previous_question_raw and _KEYWORD_QUESTION in str(description):
+        previous_question_raw = _extract_after_last_separator(description, _STRIP_TOKENS) or ""
+
+    def _extract_caseid() -> str:
+        custom_fields = issue.get("custom_fields", [])
+        if isinstance(custom_fields, dict):
+            custom_fields = [custom_fields]
+        for cf in custom_fields:
+            if not isinstance(cf, dict):
+                continue
+            if cf.get("name") == "caseid":
+                return str(cf.get("value", "")).strip()
+        return ""
+
+    # ---- ステータス判定（回答有無→未回答→caseid整合性）----
+    status = None
+    if scan["last_answer"] is None:
+        status = "no_answer_found"
+    elif scan["question_after_answer"]:
+        status = "unanswered_new_question"
+    else:
+        caseid = _extract_caseid()
+        if not caseid:
+            status = "caseid_field_missing"
+        else:
+            lines = str(last_answer_raw).strip().splitlines()
+            first3 = "\n".join(lines[:3])
+            found_caseids = _CASEID_PATTERN.findall(first3)
+            if not found_caseids:
+                status = "caseid_missing"
+            elif caseid not in found_caseids:
+                status = "caseid_mismatch"
+            elif not last_answer_raw or not previous_question_raw:
+                status = "incomplete"
+            else:
+                status = "ok"
+
+    if status is None:
+        status = "incomplete"
+
+    # ---- 直近から6000文字（max_tokens 指定時は推定トークン数）に収まるよう entries を圧縮 ----
+    if max_tokens is not None and int(max_tokens) > 0:
+        trimmed_entries = _trim_entries_by_tokens(all_entries, int(max_tokens), estimate)
+    else:
+        trimmed_entries = _trim_entries_by_chars(all_entries)
+
+    return {
+        "entries": trimmed_entries,
+        "status": status,
+        "estimated_tokens": sum(estimate(e.get("text", "") or "") for e in trimmed_entries)
+    }
+
+
+def main(inputs: Any, max_tokens: Optional[int] = None, token_estimator: Optional[Callable[[str], int]] = None):
     """
     Redmineチケットの履歴から、6000文字に収まる範囲の質問／回答ブロックを抽出し、
     caseid整合性チェックを含むステータス判定を行う。
+    max_tokens を指定した場合は文字数ではなく推定トークン数で、直近の履歴から max_tokens 以内に収める。
+    token_estimator（文字列→トークン数）を渡すと既定の推定（_estimate_tokens）の代わりに使う。
 
     出力:
     {
       "entries": [
-        {"type": "question|answer", "text": "<ログ除去済み本文>", "created_on": "<ISO日時>"},
+        {"type": "question|answer", "text": "<ログ除去済み本文（コード・スタックトレースは【…省略】に置換）>", "created_on": "<ISO日時>"},
         ...
-      ],                     # 直近から最大6000文字分
-      "status": "<status文字列>"
+      ],                     # 直近から最大6000文字分（max_tokens 指定時は推定トークン数の上限まで）
+      "status": "<status文字列>",
+      "estimated_tokens": <entries の text の推定トークン数合計>
     }
 
     --- status 一覧 ---
@@ -40,186 +371,19 @@ def main(inputs: Any):
         caseid_mismatch         : 回答冒頭に10桁数字はあるが、自分のcaseidが含まれない（誤送信の可能性）
     """
 
-    keyword_question = "Question"
-    keyword_answer = "Answer"
-    separator = "-------------------------------------------"
-    MAX_TOTAL_CHARS = 6000  # ← 全履歴の合計文字数上限
-
-    def extract_after_last_separator(text: str) -> str:
-        if not text:
-            return ""
-        clean = (
-            str(text)
-            .replace("<pre>", "")
-            .replace("</pre>", "")
-            .replace("```", "")
-            .strip()
-        )
-        if separator in clean:
-            clean = clean.split(separator)[-1]
-        return clean.strip()
-
-    def remove_logs(text: str) -> str:
-        if not text:
-            return ""
-        lines = text.splitlines()
-        filtered = []
-        for line in lines:
-            # syslog形式、長すぎる行、JSONなどを除外
-            if re.match(r"^\s*(\d{4}-\d{2}-\d{2}|\d{2}:\d{2}:\d{2}|INFO|ERROR|DEBUG|TRACE)", line):
-                continue
-            if re.match(r"^\s*[{\[].*[}\]]\s*$", line):
-                continue
-            if len(line.strip()) > 200:
-                continue
-            filtered.append(line)
-        cleaned = "\n".join(filtered).strip()
-        return cleaned if cleaned else "[ログ省略]"
-
-    def trim_entries_by_chars(entries: List[dict]) -> List[dict]:
-        total_chars = 0
-        trimmed = []
-        for entry in reversed(entries):
-            text = entry.get("text", "") or ""
-            entry_len = len(text)
-            remaining = MAX_TOTAL_CHARS - total_chars
-            if remaining <= 0:
-                break
-            if entry_len == 0:
-                trimmed.append(entry)
-                continue
-            if entry_len > remaining:
-                truncated = dict(entry)
-                truncated["text"] = text[:remaining]
-                trimmed.append(truncated)
-                total_chars = MAX_TOTAL_CHARS
-                break
-            trimmed.append(entry)
-            total_chars += entry_len
-        return list(reversed(trimmed))
-
     for entry in _normalize_entries(inputs):
-        issue = entry.get("issue", {}) if isinstance(entry, dict) else {}
-        journals = issue.get("journals", []) if isinstance(issue, dict) else []
-        description = issue.get("description", "") or ""
-        issue_created = issue.get("created_on", "")
-
-        # ---- 履歴一覧を構築（ログ・コードブロック除外）----
-        all_entries = []
-        if keyword_question in str(description):
-            desc_text = extract_after_last_separator(description)
-            if desc_text:
-                all_entries.append({
-                    "type": "question",
-                    "text": remove_logs(desc_text),
-                    "created_on": issue_created
-                })
-
-        try:
-            journals = sorted(journals, key=lambda x: x.get("created_on", ""))
-        except Exception:
-            pass
-
-        last_answer_index = None
-        last_answer_raw = ""
-
-        for idx, journal in enumerate(journals):
-            notes = str(journal.get("notes", "")) or ""
-            created_on = journal.get("created_on", "")
-            if not notes.strip():
-                continue
-
-            is_question = keyword_question in notes
-            is_answer = keyword_answer in notes
-
-            if is_question:
-                q_raw = extract_after_last_separator(notes)
-                if q_raw:
-                    all_entries.append({
-                        "type": "question",
-                        "text": remove_logs(q_raw),
-                        "created_on": created_on
-                    })
-
-            if is_answer:
-                a_raw = extract_after_last_separator(notes)
-                if a_raw:
-                    all_entries.append({
-                        "type": "answer",
-                        "text": remove_logs(a_raw),
-                        "created_on": created_on
-                    })
-                last_answer_index = idx
-                last_answer_raw = a_raw or ""
-
-        previous_question_raw = ""
-        if last_answer_index is not None:
-            for j in range(last_answer_index - 1, -1, -1):
-                notes = str(journals[j].get("notes", "")) or ""
-                if keyword_question in notes:
-                    previous_question_raw = extract_after_last_separator(notes) or ""
-                    break
-        if not previous_question_raw and keyword_question in str(description):
-            previous_question_raw = extract_after_last_separator(description) or ""
-
-        def _extract_caseid() -> str:
-            custom_fields = issue.get("custom_fields", [])
-            if isinstance(custom_fields, dict):
-                custom_fields = [custom_fields]
-            for cf in custom_fields:
-                if not isinstance(cf, dict):
-                    continue
-                if cf.get("name") == "caseid":
-                    return str(cf.get("value", "")).strip()
-            return ""
-
-        # ---- ステータス判定（回答有無→未回答→caseid整合性）----
-        status = None
-        if last_answer_index is None:
-            status = "no_answer_found"
-        else:
-            unanswered_new_question = False
-            for j in range(last_answer_index + 1, len(journals)):
-                notes = str(journals[j].get("notes", "")) or ""
-                if keyword_question in notes:
-                    has_following_answer = any(
-                        keyword_answer in str(k.get("notes", "")) for k in journals[j + 1:]
-                    )
-                    if not has_following_answer:
-                        unanswered_new_question = True
-                    break
-
-            if unanswered_new_question:
-                status = "unanswered_new_question"
-            else:
-                caseid = _extract_caseid()
-                if not caseid:
-                    status = "caseid_field_missing"
-                else:
-                    lines = str(last_answer_raw).strip().splitlines()
-                    first3 = "\n".join(lines[:3])
-                    found_caseids = re.findall(r"\d{10}", first3)
-                    if not found_caseids:
-                        status = "caseid_missing"
-                    elif caseid not in found_caseids:
-                        status = "caseid_mismatch"
-                    elif not last_answer_raw or not previous_question_raw:
-                        status = "incomplete"
-                    else:
-                        status = "ok"
-
-        if status is None:
-            status = "incomplete"
-
-        # ---- 直近から6000文字に収まるよう entries を圧縮 ----
-        trimmed_entries = trim_entries_by_chars(all_entries)
-
-        return {
-            "entries": trimmed_entries,
-            "status": status
-        }
+        return parse_issue(entry, max_tokens, token_estimator)
 
     return {
         "entries": [],
-        "status": "incomplete"
+        "status": "incomplete",
+        "estimated_tokens": 0
     }
+
+
+def main_batch(inputs: Any, max_tokens: Optional[int] = None, token_estimator: Optional[Callable[[str], int]] = None) -> dict:
+    """
+    入力に含まれる全チケットを解析する（main() は先頭の1件のみ）。
+    出力: {"results": [<main() と同じ形式の結果>, ...]}  # 入力順・1チケット1件
+    """
+    return {"results": [parse_issue(entry, max_tokens, token_estimator) for entry in _normalize_entries(inputs)]}
@@ -1,5 +1,123 @@
 import re
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+
+# 見出し（査閲結果／理由／コメント）。最初に現れた見出しだけを区切りとして扱い、2回目以降は本文の一部とみなす
+_KEY_PATTERN = re.compile(
+    r"(?:(?P<label>査閲結果|結果)|(?P<reason>理由|原因)|(?P<comment>コメント|(?i:comment)))[ \t]*[:：][ \t]*"
+)
+_VERDICT_PATTERN = re.compile(r"承認|却下|不明")
+_WHITESPACE_PATTERN = re.compile(r"\s")
+_VERDICT_CODES = {"不明": 0, "承認": 1, "却下": 2}
+
+
+class VerdictParser:
+    """
+    LLMの出力（査閲結果）を先頭から1回だけ走査して「査閲結果／理由／コメント」を取り出す。
+    feed() でストリーミング応答の断片を順に渡すと、査閲結果の行に承認・却下・不明が現れた時点で
+    result_code を返す（生成の完了を待たずに判定できる）。全文を渡し終えたら close() で結果を得る。
+
+    --- close() の戻り値 ---
+    {
+        "label": "承認|却下|不明"（判定できない場合は査閲結果の行をそのまま。見出しがなければ ""）,
+        "code": 1（承認）/ 2（却下）/ 0（不明）/ -1（判定できない）,
+        "reason": <理由（改行は空白に置換）>,
+        "comment": <コメント（改行は空白に置換）>
+    }
+    """
+
+    def __init__(self):
+        self.code: Optional[int] = None  # 判定済みの result_code（判定前は None）
+        self._pending = ""  # 改行で終わっていない末尾（見出しが途中で切れている可能性がある）
+        self._current: Optional[str] = None
+        self._parts: Dict[str, list] = {}
+
+    def feed(self, chunk: str) -> Optional[int]:
+        """断片を追加し、判定済みなら result_code（未判定なら None）を返す。"""
+        if chunk:
+            data = self._pending + chunk
+            cut = data.rfind("\n") + 1
+            if cut:
+                self._consume(data[:cut])
+            self._pending = data[cut:]
+            if self.code is None:
+                self._classify(self._pending)
+        return self.code
+
+    def close(self) -> Dict[str, Any]:
+        if self._pending:
+            self._consume(self._pending)
+            self._pending = ""
+
+        # label と code は同じ最終行から決める
+        line = self._label_line("")
+        match = _VERDICT_PATTERN.search(line)
+        if match:
+            label = match.group(0)
+            self.code = _VERDICT_CODES[label]
+        else:
+            label = _WHITESPACE_PATTERN.sub("", line)
+            self.code = None
+        return {
+            "label": label,
+            "code": self.code if self.code is not None else -1,
+            "reason": self._section_text("reason"),
+            "comment": self._section_text("comment"),
+        }
+
+    def _consume(self, block: str) -> None:
+        pos = 0
+        for match in _KEY_PATTERN.finditer(block):
+            kind = match.lastgroup
+            if kind in self._parts:
+                continue
+            self._append(block[pos:match.start()])
+            self._current = kind
+            self._parts[kind] = []
+            pos = match.end()
+        self._append(block[pos:])
+
+    def _append(self, text: str) -> None:
+        if self._current is not None and text:
+            self._parts[self._current].append(text)
+
+    def _label_line(self, tail: str) -> str:
+        """査閲結果の見出し以降で最初の空でない行。tail は未確定の末尾（ストリーミング中のみ）。"""
+        # tail も _consume() と同じ規則で見出しを区切り、次の見出し以降を査閲結果に含めない
+        pieces = self._parts.get("label", [])[:]
+        current = self._current
+        seen = set(self._parts)
+        pos = 0
+        for match in _KEY_PATTERN.finditer(tail):
+            kind = match.lastgroup
+            if kind in seen:
+                continue
+            if current == "label":
+                break
+            seen.add(kind)
+            current = kind
+            pos = match.end()
+        else:
+            match = None
+        if current == "label":
+            pieces.append(tail[pos:match.start() if match else len(tail)])
+        return "".join(pieces).lstrip().split("\n", 1)[0].strip()
+
+    def _classify(self, tail: str) -> None:
+        # 行内で最初に現れた語で判定するため、後続の断片で結果が変わることはない
+        match = _VERDICT_PATTERN.search(self._label_line(tail))
+        if match:
+            self.code = _VERDICT_CODES[match.group(0)]
+
+    def _section_text(self, kind: str) -> str:
+        return "".join(self._parts.get(kind, ())).replace("\r", "").replace("\n", " ").strip()
+
+
+def parse_verdict(text: str) -> Dict[str, Any]:
+    """全文を一度に解析する（VerdictParser と同じ結果）。"""
+    parser = VerdictParser()
+    parser.feed(text)
+    return parser.close()
+
 
 def main(inputs: Any) -> Dict[str, Any]:
     """
@@ -42,29 +160,10 @@ def main(inputs: Any) -> Dict[str, Any]:
             "result_code": -1
         }
 
-    # 正規表現で「査閲結果」「理由」を抽出
-    match = re.search(r"査閲結果[:：]\s*([^\n\r]+)", text)
-    label = match.group(1).strip() if match else ""
-
-    reason_match = re.search(r"理由[:：]\s*(.+)", text, re.DOTALL)
-    reason = reason_match.group(1).strip() if reason_match else ""
-
-    # 結果を正規化（日本語以外でも誤認しにくいように）
-    label_norm = re.sub(r"\s", "", label)
-    reason = reason.replace("\r", "").replace("\n", " ").strip()
-
-    if "承認" in label_norm:
-        code = 1
-    elif "却下" in label_norm:
-        code = 2
-    elif "不明" in label_norm:
-        code = 0
-    else:
-        code = -1
-
+    verdict = parse_verdict(text)
     return {
-        "status": "ok" if code >= 0 else "parse_error",
-        "result_label": label_norm or "",
-        "result_reason": reason,
-        "result_code": code
-    }
\ No newline at end of file
+        "status": "ok" if verdict["code"] >= 0 else "parse_error",
+        "result_label": verdict["label"],
+        "result_reason": verdict["reason"],
+        "result_code": verdict["code"]
+    }
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Any, Dict, Iterator, List
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_APPEND_SECONDS = metrics.histogram("review_result_append_duration_seconds", "査閲結果1行の追記の所要時間", ["sink"])
+_FLUSH_SECONDS = metrics.histogram(
+    "review_result_flush_duration_seconds", "査閲結果の書き込み（Excel保存 / fsync）の所要時間", ["sink"]
+)
+
+HEADER = ["記録日時", "チケットID", "件名", "査閲結果", "理由", "Comment", "使用LLM"]
+
+RESULT_FILL_COLORS = {
+    "承認": "C6EFCE",  # Light green
+    "却下": "FFC7CE",  # Light red
+    "不明": "D9D9D9",  # Gray
+}
+
+
+def build_result_row(issue: Dict[str, Any], result: Dict[str, Any], default_llm: str = "") -> Dict[str, Any]:
+    """Excelの列名 → 値 の辞書を作る。記録日時は呼び出し時点のローカル時刻。"""
+    recorded_at = datetime.now(timezone.utc).astimezone().strftime("%Y-%m-%d %H:%M:%S%z")
+    return {
+        "記録日時": recorded_at,
+        "チケットID": issue.get("id"),
+        "件名": issue.get("subject"),
+        "査閲結果": result.get("査閲結果", "不明"),
+        "理由": result.get("理由", ""),
+        "Comment": result.get("comment", ""),
+        "使用LLM": result.get("LLM", default_llm),
+    }
+
+
+def result_fill(result_value: str):
+    """査閲結果に対応する行の塗りつぶし。対象外ならNone。"""
+    fill_color = RESULT_FILL_COLORS.get((result_value or "").strip())
+    if not fill_color:
+        return None
+    return PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
+
+
+class ExcelResultWriter:
+    """
+    査閲結果の行をメモリに溜め、flush() で1回の load → 追記 → save にまとめて書き込む。
+    flush_interval 秒（0なら毎回）経過前の maybe_flush() は何もしない。
+    """
+
+    def __init__(self, path: str, *, default_llm: str = "", flush_interval: float = 0):
+        self.path = path
+        self.default_llm = default_llm
+        self.flush_interval = flush_interval
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def append(self, issue: Dict[str, Any], result: Dict[str, Any]) -> None:
+        if not result:
+            return
+        with _APPEND_SECONDS.time(sink="excel"), self._lock:
+            self._rows.append(build_result_row(issue, result, self.default_llm))
+
+    def maybe_flush(self) -> int:
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        """溜めた行を書き込み、書き込んだ行数を返す。失敗時は行を保持して次回再試行する。"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._rows:
+                return 0
+            rows = self._rows
+            started = time.perf_counter()
+            try:
+                if os.path.exists(self.path):
+                    wb = load_workbook(self.path)
+                    ws = wb.active
+                else:
+                    wb = Workbook()
+                    ws = wb.active
+                    ws.title = "査閲結果"
+                    ws.append(HEADER)
+
+                header = [cell.value for cell in ws[1]]
+                if "使用LLM" not in header:
+                    ws.cell(row=1, column=len(header) + 1).value = "使用LLM"
+                    header.append("使用LLM")
+                if "Comment" not in header:
+                    ws.cell(row=1, column=len(header) + 1).value = "Comment"
+                    header.append("Comment")
+
+                for row_map in rows:
+                    ws.append([row_map.get(col, "") for col in header])
+                    fill = result_fill(row_map.get("査閲結果"))
+                    if fill is not None:
+                        for cell in ws[ws.max_row]:
+                            cell.fill = fill
+
+                wb.save(self.path)
+            except Exception as e:
+                logger.error("Excel追記に失敗しました(%d行を保持して再試行します): %s", len(rows), e)
+                return 0
+            finally:
+                _FLUSH_SECONDS.observe(time.perf_counter() - started, sink="excel")
+
+            self._rows = []
+            logger.debug("Excelに査閲結果を%d行追記しました: %s", len(rows), self.path)
+            return len(rows)
+
+
+class JsonlResultLog:
+    """
+    査閲結果を追記専用のJSONL（1行1結果、キーはExcelの列名）に書き込む。
+    行は即座にファイルへ書き、fsync は flush() にまとめる（flush_interval 秒未満の maybe_flush() は何もしない）。
+    Excelは export_excel() で必要なときに生成する。
+    """
+
+    def __init__(self, path: str, *, default_llm: str = "", flush_interval: float = 0):
+        self.path = path
+        self.default_llm = default_llm
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._fh = None
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def _file(self):
+        if self._fh is None:
+            self._fh = open(self.path, "a", encoding="utf-8")
+        return self._fh
+
+    def append(self, issue: Dict[str, Any], result: Dict[str, Any]) -> None:
+        if not result:
+            return
+        with _APPEND_SECONDS.time(sink="jsonl"):
+            line = json.dumps(build_result_row(issue, result, self.default_llm), ensure_ascii=False)
+            with self._lock:
+                try:
+                    self._file().write(line + "\n")
+                    self._dirty = True
+                except OSError as e:
+                    logger.error("査閲結果ログへの追記に失敗しました: %s", e)
+
+    def maybe_flush(self) -> int:
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        """未同期の追記をディスクへ fsync する。同期した場合1、不要なら0。"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._dirty or self._fh is None:
+                return 0
+            try:
+                with _FLUSH_SECONDS.time(sink="jsonl"):
+                    self._fh.flush()
+                    os.fsync(self._fh.fileno())
+            except OSError as e:
+                logger.error("査閲結果ログの同期に失敗しました: %s", e)
+                return 0
+            self._dirty = False
+            return 1
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def iter_result_log(log_path: str) -> Iterator[Dict[str, Any]]:
+    """JSONLを1行ずつ読み出す。壊れた行（書き込み途中の末尾など）は読み飛ばす。"""
+    with open(log_path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning("査閲結果ログの%d行目を解釈できないため読み飛ばします。", lineno)
+
+
+def export_excel(log_path: str, excel_path: str) -> int:
+    """
+    JSONLからExcelを1パスで生成する（openpyxlのwrite-onlyモード）。
+    一時ファイルに書いてから置き換えるため、途中で失敗しても既存のExcelは壊れない。書き出した行数を返す。
+    ログが存在しない・1行も記録がない場合は、既存のExcelを空のブックで上書きしないよう例外を送出する。
+    """
+    if not os.path.isfile(log_path):
+        raise FileNotFoundError(f"査閲結果ログが見つかりません: {log_path}")
+    rows = iter_result_log(log_path)
+    first = next(rows, None)
+    if first is None:
+        raise ValueError(f"査閲結果ログに記録がありません: {log_path}")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("査閲結果")
+    ws.append(HEADER)
+    fills = {value: result_fill(value) for value in RESULT_FILL_COLORS}
+
+    count = 0
+    for row_map in chain((first,), rows):
+        fill = fills.get(str(row_map.get("査閲結果") or "").strip())
+        cells = []
+        for col in HEADER:
+            cell = WriteOnlyCell(ws, value=row_map.get(col, ""))
+            if fill is not None:
+                cell.fill = fill
+            cells.append(cell)
+        ws.append(cells)
+        count += 1
+
+    tmp_path = f"{excel_path}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, excel_path)
+    return count
+
+
+def import_excel(excel_path: str, log_path: str) -> int:
+    """既存のExcelの行をJSONLへ追記する（JSONL運用へ移行する際の初回のみ）。追記した行数を返す。"""
+    wb = load_workbook(excel_path, read_only=True)
+    ws = wb.active
+    rows = ws.iter_rows(values_only=True)
+    header = list(next(rows, []))
+    count = 0
+    with open(log_path, "a", encoding="utf-8") as fh:
+        for values in rows:
+            row_map = {col: value for col, value in zip(header, values) if col in HEADER}
+            if not any(v not in (None, "") for v in row_map.values()):
+                continue
+            fh.write(json.dumps(row_map, ensure_ascii=False, default=str) + "\n")
+            count += 1
+        fh.flush()
+        os.fsync(fh.fileno())
+    wb.close()
+    return count
+
+
+def cli(argv=None) -> int:
+    default_log = os.getenv("REVIEW_RESULT_LOG", "/var/lib/redmine_dify_monitor/review_results.jsonl")
+    default_excel = os.getenv("REVIEW_RESULT_EXCEL", "/var/lib/redmine_dify_monitor/review_results.xlsx")
+
+    ap = argparse.ArgumentParser(description="査閲結果ログ(JSONL)とExcelの変換")
+    sub = ap.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="JSONLからExcelを生成する")
+    export_cmd.add_argument("--log", default=default_log)
+    export_cmd.add_argument("--output", default=default_excel)
+    import_cmd = sub.add_parser("import-excel", help="既存のExcelの行をJSONLへ取り込む")
+    import_cmd.add_argument("--excel", default=default_excel)
+    import_cmd.add_argument("--log", default=default_log)
+    args = ap.parse_args(argv)
+
+    if args.command == "export":
+        try:
+            count = export_excel(args.log, args.output)
+        except (OSError, ValueError) as e:
+            print(f"Excelを生成しませんでした（既存のExcelはそのままです）: {e}", file=sys.stderr)
+            return 1
+        print(f"{count}行を書き出しました: {args.output}")
+    else:
+        count = import_excel(args.excel, args.log)
+        print(f"{count}行を取り込みました: {args.log}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -1,22 +1,78 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
 import logging
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Iterable, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from dateutil import parser
+import metrics
+from timestamp_utils import parse_timestamp_utc
 
 logger = logging.getLogger(__name__)
 
+_DB_WRITE_SECONDS = metrics.histogram(
+    "state_db_write_duration_seconds", "状態DBへの書き込み（コミットまで）の所要時間", ["operation"]
+)
+
 _PRAGMAS: Tuple[Tuple[str, str], ...] = (
     ("journal_mode", "WAL"),
     ("synchronous", "NORMAL"),
 )
 
 
+_UPSERT_PROCESSED_SQL = """
+    INSERT INTO processed_issues (issue_id, updated_on, updated_epoch, last_seen_at)
+    VALUES (?, ?, ?, strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+    ON CONFLICT(issue_id) DO UPDATE SET
+        updated_on=excluded.updated_on,
+        updated_epoch=excluded.updated_epoch,
+        last_seen_at=strftime('%Y-%m-%dT%H:%M:%SZ','now')
+"""
+
+# updated_epoch が古いものから chunk 件ずつ削除する（1トランザクションを短く保つ）
+_PRUNE_PROCESSED_SQL = """
+    DELETE FROM processed_issues WHERE issue_id IN (
+        SELECT issue_id FROM processed_issues WHERE updated_epoch < ? LIMIT ?
+    )
+"""
+
+_UPSERT_WATERMARK_SQL = """
+    INSERT INTO poll_state (key, value, updated_at)
+    VALUES (?, ?, strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+    ON CONFLICT(key) DO UPDATE SET
+        value=excluded.value,
+        updated_at=strftime('%Y-%m-%dT%H:%M:%SZ','now')
+"""
+
+_DELETE_SUPERSEDED_JOBS_SQL = (
+    "DELETE FROM analysis_jobs WHERE issue_id = ? AND state = 'pending' AND updated_on <> ?"
+)
+
+# 送信済み・送信断念の通知を、最後の送信時刻（next_attempt_at）が古いものから chunk 件ずつ削除する
+_PRUNE_NOTIFICATIONS_SQL = """
+    DELETE FROM notification_outbox WHERE id IN (
+        SELECT id FROM notification_outbox
+        WHERE state IN ('delivered', 'failed') AND next_attempt_at < ? LIMIT ?
+    )
+"""
+
+_INSERT_NOTIFICATION_SQL = """
+    INSERT OR IGNORE INTO notification_outbox (dedup_key, webhook, payload, label, state, next_attempt_at)
+    VALUES (?, ?, ?, ?, 'pending', ?)
+"""
+
+_INSERT_JOB_SQL = """
+    INSERT OR IGNORE INTO analysis_jobs (issue_id, updated_on, payload, state, visible_at)
+    VALUES (?, ?, ?, 'pending', ?)
+"""
+
+
 def _apply_pragmas(conn: sqlite3.Connection) -> None:
     """必要なPRAGMAを適用し、失敗した場合は警告ログを出す。"""
     for pragma, value in _PRAGMAS:
@@ -26,6 +82,34 @@ def _apply_pragmas(conn: sqlite3.Connection) -> None:
             logger.warning("PRAGMA %s=%s の設定に失敗しました: %s", pragma, value, exc)
 
 
+def _updated_epoch(updated_on: Optional[str]) -> Optional[int]:
+    """updated_on をUNIX時刻（秒）にする。解釈できない場合はNone（プルーニング対象外）。"""
+    if not updated_on:
+        return None
+    try:
+        return int(parse_timestamp_utc(updated_on).timestamp())
+    except Exception:
+        return None
+
+
+def _processed_row(issue_id: str, updated_on: str) -> Tuple[str, str, Optional[int]]:
+    return str(issue_id), updated_on, _updated_epoch(updated_on)
+
+
+def _migrate_processed_epoch(conn: sqlite3.Connection) -> None:
+    """旧スキーマの processed_issues に updated_epoch 列を追加し、既存行を埋める。"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(processed_issues)")}
+    if "updated_epoch" in columns:
+        return
+    conn.execute("ALTER TABLE processed_issues ADD COLUMN updated_epoch INTEGER")
+    rows = conn.execute("SELECT issue_id, updated_on FROM processed_issues").fetchall()
+    conn.executemany(
+        "UPDATE processed_issues SET updated_epoch = ? WHERE issue_id = ?",
+        [(_updated_epoch(updated_on), issue_id) for issue_id, updated_on in rows],
+    )
+    logger.info("processed_issues に updated_epoch 列を追加しました（既存%d件）。", len(rows))
+
+
 @contextmanager
 def open_db(db_path: str) -> Iterable[sqlite3.Connection]:
     """WALなどのPRAGMAを適用した状態でコネクションを管理する。"""
@@ -46,10 +130,78 @@ def init_state_db(db_path: str) -> None:
                 CREATE TABLE IF NOT EXISTS processed_issues (
                     issue_id TEXT PRIMARY KEY,
                     updated_on TEXT NOT NULL,
-                    last_seen_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+                    last_seen_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
+                    updated_epoch INTEGER
+                )
+                """
+            )
+            _migrate_processed_epoch(conn)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_processed_issues_epoch ON processed_issues (updated_epoch)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS poll_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS analysis_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    issue_id TEXT NOT NULL,
+                    updated_on TEXT NOT NULL,
+                    payload TEXT NOT NULL DEFAULT '{}',
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    visible_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
+                    UNIQUE(issue_id, updated_on)
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    issue_id TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    result_text TEXT,
+                    status TEXT,
+                    comment TEXT,
+                    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_state ON analysis_jobs (state, visible_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_issue ON analysis_jobs (issue_id, state)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedup_key TEXT NOT NULL UNIQUE,
+                    webhook TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    label TEXT,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
+                    delivered_at TEXT
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_notification_outbox_state ON notification_outbox (state, next_attempt_at)"
+            )
             conn.commit()
     except sqlite3.Error as exc:
         logger.error("状態DB初期化に失敗しました: %s", exc)
@@ -76,21 +228,119 @@ def save_processed_issue(db_path: str, issue_id: str, updated_on: str) -> None:
     """チケットの処理済み状態を挿入または更新する。"""
     try:
         with open_db(db_path) as conn:
-            conn.execute(
-                """
-                INSERT INTO processed_issues (issue_id, updated_on, last_seen_at)
-                VALUES (?, ?, strftime('%Y-%m-%dT%H:%M:%SZ','now'))
-                ON CONFLICT(issue_id) DO UPDATE SET
-                    updated_on=excluded.updated_on,
-                    last_seen_at=strftime('%Y-%m-%dT%H:%M:%SZ','now')
-                """,
-                (str(issue_id), updated_on),
-            )
+            conn.execute(_UPSERT_PROCESSED_SQL, _processed_row(issue_id, updated_on))
             conn.commit()
     except sqlite3.Error as exc:
         logger.error("状態DBの更新に失敗しました(issue_id=%s): %s", issue_id, exc)
 
 
+# --- 解析ジョブキュー ---
+# state: pending（待機）/ claimed（処理中。visible_at を過ぎると再取得可能）/ failed（再試行上限到達）
+# 完了したジョブは削除する。
+
+def _claim_jobs(conn: sqlite3.Connection, limit: int, visibility_timeout: float) -> List[dict]:
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            """
+            SELECT id, issue_id, updated_on, payload, attempts FROM analysis_jobs AS j
+            WHERE state IN ('pending', 'claimed') AND visible_at <= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM analysis_jobs AS o
+                  WHERE o.issue_id = j.issue_id AND o.state IN ('pending', 'claimed') AND o.id < j.id
+              )
+            ORDER BY id
+            LIMIT ?
+            """,
+            (now, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE analysis_jobs SET state = 'claimed', attempts = attempts + 1, visible_at = ? WHERE id = ?",
+            [(now + visibility_timeout, row[0]) for row in rows],
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    jobs = []
+    for job_id, issue_id, updated_on, payload, attempts in rows:
+        try:
+            issue = json.loads(payload)
+        except ValueError:
+            issue = {}
+        jobs.append({
+            "id": job_id,
+            "issue_id": issue_id,
+            "updated_on": updated_on,
+            "issue": issue,
+            "attempts": attempts + 1,
+        })
+    return jobs
+
+
+def _fail_job(conn: sqlite3.Connection, job_id: int, error: str, max_attempts: int, retry_delay: float) -> bool:
+    row = conn.execute("SELECT attempts FROM analysis_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return False
+    attempts = row[0]
+    if attempts >= max_attempts:
+        conn.execute(
+            "UPDATE analysis_jobs SET state = 'failed', last_error = ? WHERE id = ?",
+            (error, job_id),
+        )
+        retry = False
+    else:
+        conn.execute(
+            "UPDATE analysis_jobs SET state = 'pending', last_error = ?, visible_at = ? WHERE id = ?",
+            (error, time.time() + retry_delay * 2 ** (attempts - 1), job_id),
+        )
+        retry = True
+    conn.commit()
+    return retry
+
+
+def requeue_claimed_jobs(db_path: str) -> int:
+    """起動時に前回プロセスが処理中だったジョブを即時再実行可能に戻し、件数を返す。"""
+    try:
+        init_state_db(db_path)
+        with open_db(db_path) as conn:
+            cursor = conn.execute(
+                "UPDATE analysis_jobs SET state = 'pending', visible_at = ? WHERE state = 'claimed'",
+                (time.time(),),
+            )
+            conn.commit()
+            return cursor.rowcount
+    except sqlite3.Error as exc:
+        logger.error("処理中ジョブの再登録に失敗しました: %s", exc)
+        return 0
+
+
+# --- 解析結果キャッシュ（Q&A内容のハッシュ → 前回のDify解析結果） ---
+
+_CachedOutcome = Tuple[Optional[str], Optional[str], Optional[str]]
+
+_UPSERT_CACHE_SQL = """
+    INSERT INTO analysis_cache (issue_id, content_hash, result_text, status, comment, updated_at)
+    VALUES (?, ?, ?, ?, ?, strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+    ON CONFLICT(issue_id) DO UPDATE SET
+        content_hash=excluded.content_hash,
+        result_text=excluded.result_text,
+        status=excluded.status,
+        comment=excluded.comment,
+        updated_at=strftime('%Y-%m-%dT%H:%M:%SZ','now')
+"""
+
+
+def _load_cached_analysis(conn: sqlite3.Connection, issue_id: str, content_hash: str) -> Optional[_CachedOutcome]:
+    row = conn.execute(
+        "SELECT result_text, status, comment FROM analysis_cache WHERE issue_id = ? AND content_hash = ?",
+        (str(issue_id), content_hash),
+    ).fetchone()
+    return tuple(row) if row else None
+
+
 def delete_processed_issue(db_path: str, issue_id: str) -> None:
     """指定チケットを状態DBから削除する。存在しなくても成功扱い。"""
     try:
@@ -101,33 +351,432 @@ def delete_processed_issue(db_path: str, issue_id: str) -> None:
         logger.error("状態DBの削除に失敗しました(issue_id=%s): %s", issue_id, exc)
 
 
-def prune_stale_issues(db_path: str, max_age_days: int = 180) -> int:
-    """updated_onが一定期間より古いレコードを削除し、削除数を返す。"""
-    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+def _prune_stale_issues(conn: sqlite3.Connection, cutoff_epoch: int, chunk_size: int) -> int:
+    """updated_epoch が cutoff_epoch より古い行を最大 chunk_size 件削除してコミットし、削除数を返す。"""
+    cursor = conn.execute(_PRUNE_PROCESSED_SQL, (cutoff_epoch, chunk_size))
+    conn.commit()
+    return cursor.rowcount
+
+
+def prune_stale_issues(db_path: str, max_age_days: int = 180, *, chunk_size: int = 500) -> int:
+    """
+    updated_onが一定期間より古いレコードを削除し、削除数を返す。
+    updated_epoch のインデックスで chunk_size 件ずつ削除し、書き込みロックを長時間保持しない。
+    """
+    cutoff_epoch = int((datetime.now(timezone.utc) - timedelta(days=max_age_days)).timestamp())
     removed = 0
     try:
         with open_db(db_path) as conn:
-            cursor = conn.execute("SELECT issue_id, updated_on FROM processed_issues")
-            stale_ids = []
-            for issue_id, updated_on in cursor.fetchall():
-                if not updated_on:
-                    continue
-                try:
-                    dt = parser.parse(updated_on)
-                    if dt.tzinfo is None:
-                        dt = dt.replace(tzinfo=timezone.utc)
-                    else:
-                        dt = dt.astimezone(timezone.utc)
-                except Exception:
-                    continue
-                if dt < cutoff:
-                    stale_ids.append(issue_id)
-
-            for issue_id in stale_ids:
-                conn.execute("DELETE FROM processed_issues WHERE issue_id = ?", (issue_id,))
-            if stale_ids:
-                conn.commit()
-            removed = len(stale_ids)
+            while True:
+                deleted = _prune_stale_issues(conn, cutoff_epoch, chunk_size)
+                removed += deleted
+                if deleted < chunk_size:
+                    break
     except sqlite3.Error as exc:
         logger.error("状態DBの古いレコード削除に失敗しました: %s", exc)
     return removed
+
+
+class StateStore:
+    """
+    プロセス存続中は1本のコネクションを保持する状態DB。
+    1回のポーリングで決まった processed_issues の更新・解析ジョブの登録・高水位マークは、
+    record_poll() で executemany により1トランザクションにまとめてコミットする。
+    ワーカースレッドからも呼べるよう、コネクション操作はロックで直列化する。
+    処理済み状態の参照は最大 cache_size 件のLRUに載せ、ミスした分だけ主キーでDBを引く。
+    """
+
+    # SQLiteのバインド変数上限（古いビルドでは999）を超えないよう IN (...) を分割する
+    _LOOKUP_CHUNK = 500
+
+    def __init__(self, db_path: str, *, cache_size: int = 10000):
+        init_state_db(db_path)
+        self.db_path = db_path
+        self.cache_size = max(0, cache_size)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        _apply_pragmas(self._conn)
+        self._lock = threading.RLock()
+        self._closed = False  # close() 後は停止時に取り残されたワーカーからの呼び出しを黙って無視する
+        self._processed: Dict[str, str] = {}
+        self._jobs: Dict[str, Tuple[str, str, str, float]] = {}
+        self._watermarks: Dict[str, str] = {}
+        self._processed_cache: "OrderedDict[str, str]" = OrderedDict()
+
+    # --- ポーリング結果の一括書き込み ---
+
+    def record_poll(
+        self,
+        processed: Iterable[Tuple[str, str]] = (),
+        jobs: Iterable[Tuple[str, str, Optional[dict]]] = (),
+        watermark: Optional[str] = None,
+        key: str = "issues_updated_on",
+    ) -> int:
+        """
+        1回のポーリングの結果をまとめて1トランザクションで書き込み、書き込んだ件数を返す。
+        processed: 処理済みとしてのみ記録する (issue_id, updated_on)
+        jobs: 解析ジョブとして登録する (issue_id, updated_on, payload)
+        """
+        with self._lock:
+            for issue_id, updated_on in processed:
+                self._buffer_processed(str(issue_id), updated_on)
+            for issue_id, updated_on, payload in jobs:
+                self._buffer_job(str(issue_id), updated_on, payload)
+            if watermark:
+                self._watermarks[key] = watermark
+            return self.flush()
+
+    def _buffer_processed(self, issue_id: str, updated_on: str) -> None:
+        self._processed[issue_id] = updated_on
+        self._remember_processed(issue_id, updated_on)
+
+    def _buffer_job(self, issue_id: str, updated_on: str, payload: Optional[dict]) -> None:
+        # 同一チケットがバッファ内で複数回更新された場合は最新のみ登録する
+        self._jobs[issue_id] = (issue_id, updated_on, json.dumps(payload or {}, ensure_ascii=False), time.time())
+        self._buffer_processed(issue_id, updated_on)
+
+    def flush(self) -> int:
+        """バッファ内の更新を1トランザクションで書き込み、書き込んだ件数を返す。失敗時はバッファを保持して例外を送出する。"""
+        with self._lock:
+            if not (self._processed or self._jobs or self._watermarks):
+                return 0
+            try:
+                with _DB_WRITE_SECONDS.time(operation="flush"):
+                    jobs = list(self._jobs.values())
+                    self._conn.executemany(_DELETE_SUPERSEDED_JOBS_SQL, [(job[0], job[1]) for job in jobs])
+                    self._conn.executemany(_INSERT_JOB_SQL, jobs)
+                    self._conn.executemany(
+                        _UPSERT_PROCESSED_SQL, [_processed_row(*item) for item in self._processed.items()]
+                    )
+                    self._conn.executemany(_UPSERT_WATERMARK_SQL, list(self._watermarks.items()))
+                    self._conn.commit()
+            except sqlite3.Error as exc:
+                self._conn.rollback()
+                logger.error("状態DBへの一括書き込みに失敗しました: %s", exc)
+                raise
+            written = len(self._processed) + len(self._jobs) + len(self._watermarks)
+            self._processed.clear()
+            self._jobs.clear()
+            self._watermarks.clear()
+            return written
+
+    def prune_stale_issues(self, max_age_days: int = 180, *, chunk_size: int = 500) -> int:
+        """
+        prune_stale_issues() と同じ。チャンクごとにロックを解放するため、
+        削除中もワーカースレッドのジョブ取得・完了記録が待たされにくい。
+        """
+        cutoff_epoch = int((datetime.now(timezone.utc) - timedelta(days=max_age_days)).timestamp())
+        removed = 0
+        while True:
+            with self._lock:
+                try:
+                    with _DB_WRITE_SECONDS.time(operation="prune"):
+                        deleted = _prune_stale_issues(self._conn, cutoff_epoch, chunk_size)
+                except sqlite3.Error as exc:
+                    self._conn.rollback()
+                    logger.error("状態DBの古いレコード削除に失敗しました: %s", exc)
+                    return removed
+            removed += deleted
+            if deleted < chunk_size:
+                return removed
+
+    def prune_notifications(self, max_age_days: int = 7, *, chunk_size: int = 500) -> int:
+        """
+        送信済み（delivered）・送信断念（failed）になってから max_age_days 日を超えた通知を削除し、削除数を返す。
+        保持期間中は dedup_key が残るため、同じ通知の再登録は従来どおり無視される。
+        """
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        while True:
+            with self._lock:
+                try:
+                    with _DB_WRITE_SECONDS.time(operation="prune_notifications"):
+                        cursor = self._conn.execute(_PRUNE_NOTIFICATIONS_SQL, (cutoff, chunk_size))
+                        self._conn.commit()
+                except sqlite3.Error as exc:
+                    self._conn.rollback()
+                    logger.error("通知アウトボックスの古いレコード削除に失敗しました: %s", exc)
+                    return removed
+            removed += cursor.rowcount
+            if cursor.rowcount < chunk_size:
+                return removed
+
+    def close(self) -> None:
+        """バッファを書き出してコネクションを閉じる。"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
+            self._conn.close()
+
+    # --- 読み込み・即時書き込み ---
+
+    def load_processed_issues(self) -> Dict[str, str]:
+        """issue_id → updated_on の辞書を返す（全件読み込み。監視ループでは get_processed_issues を使う）。"""
+        with self._lock:
+            try:
+                cursor = self._conn.execute("SELECT issue_id, updated_on FROM processed_issues")
+                return {issue_id: updated_on for issue_id, updated_on in cursor.fetchall()}
+            except sqlite3.Error as exc:
+                logger.error("状態DBの読み込みに失敗しました: %s", exc)
+                return {}
+
+    # --- 処理済み状態の参照（LRU + 主キー検索） ---
+
+    def _remember_processed(self, issue_id: str, updated_on: str) -> None:
+        if not self.cache_size:
+            return
+        cache = self._processed_cache
+        cache[issue_id] = updated_on
+        cache.move_to_end(issue_id)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def get_processed_issue(self, issue_id: str) -> Optional[str]:
+        """チケットの処理済み updated_on を返す。未処理ならNone。"""
+        return self.get_processed_issues([issue_id]).get(str(issue_id))
+
+    def get_processed_issues(self, issue_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        複数チケットの処理済み updated_on を issue_id（文字列）→ updated_on で返す（未処理のものは含まない）。
+        LRUにないものだけを IN (...) でまとめて検索する。
+        """
+        found: Dict[str, str] = {}
+        with self._lock:
+            misses = []
+            for issue_id in dict.fromkeys(str(i) for i in issue_ids):
+                if issue_id in self._processed:
+                    found[issue_id] = self._processed[issue_id]
+                elif issue_id in self._processed_cache:
+                    self._processed_cache.move_to_end(issue_id)
+                    found[issue_id] = self._processed_cache[issue_id]
+                else:
+                    misses.append(issue_id)
+            try:
+                for start in range(0, len(misses), self._LOOKUP_CHUNK):
+                    chunk = misses[start:start + self._LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    cursor = self._conn.execute(
+                        f"SELECT issue_id, updated_on FROM processed_issues WHERE issue_id IN ({placeholders})", chunk
+                    )
+                    for issue_id, updated_on in cursor:
+                        found[issue_id] = updated_on
+                        self._remember_processed(issue_id, updated_on)
+            except sqlite3.Error as exc:
+                logger.error("状態DBの読み込みに失敗しました: %s", exc)
+                raise
+        return found
+
+    def filter_changed(self, pairs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        1ページ分の (issue_id, updated_on) のうち、処理済みの updated_on と異なるもの（未処理を含む）を
+        入力順に返す。LRUにないものは1回の IN (...) 検索でまとめて引く。
+        """
+        pairs = list(pairs)
+        known = self.get_processed_issues(issue_id for issue_id, _ in pairs)
+        return [(issue_id, updated_on) for issue_id, updated_on in pairs if known.get(str(issue_id)) != updated_on]
+
+    def load_watermark(self, key: str = "issues_updated_on") -> Optional[str]:
+        """インクリメンタル取得用の高水位マークを返す。"""
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT value FROM poll_state WHERE key = ?", (key,)).fetchone()
+                return row[0] if row else None
+            except sqlite3.Error as exc:
+                logger.error("高水位マークの読み込みに失敗しました(key=%s): %s", key, exc)
+                return None
+
+    def claim_jobs(self, limit: int, visibility_timeout: float) -> List[dict]:
+        """
+        実行可能なジョブを最大limit件取得し、visibility_timeout秒だけ他から見えなくする。
+        同一チケットは古いジョブが残っている間は新しいジョブを取得しない（更新順を保証）。
+        """
+        if limit <= 0:
+            return []
+        with self._lock:
+            try:
+                with _DB_WRITE_SECONDS.time(operation="claim_jobs"):
+                    return _claim_jobs(self._conn, limit, visibility_timeout)
+            except sqlite3.Error as exc:
+                logger.error("解析ジョブの取得に失敗しました: %s", exc)
+                return []
+
+    def count_jobs(self) -> Dict[str, int]:
+        """解析ジョブの state ごとの件数を返す。"""
+        with self._lock:
+            try:
+                rows = self._conn.execute("SELECT state, COUNT(*) FROM analysis_jobs GROUP BY state").fetchall()
+                return dict(rows)
+            except sqlite3.Error as exc:
+                logger.error("解析ジョブ件数の取得に失敗しました: %s", exc)
+                return {}
+
+    def complete_job(self, job_id: int, notifications: Optional[List[dict]] = None) -> None:
+        """
+        ジョブを完了としてキューから削除する。notifications（dedup_key / webhook / payload / label）があれば
+        同じトランザクションで通知アウトボックスへ登録する。dedup_key が登録済みの通知は無視する。
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                with _DB_WRITE_SECONDS.time(operation="complete_job"):
+                    self._conn.execute("DELETE FROM analysis_jobs WHERE id = ?", (job_id,))
+                    self._conn.executemany(
+                        _INSERT_NOTIFICATION_SQL,
+                        [
+                            (
+                                item["dedup_key"],
+                                item["webhook"],
+                                json.dumps(item["payload"], ensure_ascii=False),
+                                item.get("label"),
+                                now,
+                            )
+                            for item in notifications or ()
+                        ],
+                    )
+                    self._conn.commit()
+            except sqlite3.Error as exc:
+                self._conn.rollback()
+                logger.error("解析ジョブの完了記録に失敗しました(job_id=%s): %s", job_id, exc)
+
+    def fail_job(self, job_id: int, error: str, *, max_attempts: int = 3, retry_delay: float = 60.0) -> bool:
+        """
+        ジョブの失敗を記録する。試行回数が上限未満なら retry_delay * 2^(試行回数-1) 秒後に再実行、
+        上限に達したら failed にする。再実行予定ならTrue。
+        """
+        with self._lock:
+            try:
+                with _DB_WRITE_SECONDS.time(operation="fail_job"):
+                    return _fail_job(self._conn, job_id, error, max_attempts, retry_delay)
+            except sqlite3.Error as exc:
+                self._conn.rollback()
+                logger.error("解析ジョブの失敗記録に失敗しました(job_id=%s): %s", job_id, exc)
+                return False
+
+    def load_cached_analysis(self, issue_id: str, content_hash: str) -> Optional[_CachedOutcome]:
+        """同じ内容ハッシュで解析済みなら (result_text, status, comment) を返す。"""
+        with self._lock:
+            if self._closed:
+                return None
+            try:
+                return _load_cached_analysis(self._conn, issue_id, content_hash)
+            except sqlite3.Error as exc:
+                logger.error("解析キャッシュの読み込みに失敗しました(issue_id=%s): %s", issue_id, exc)
+                return None
+
+    def save_cached_analysis(self, issue_id: str, content_hash: str, outcome: _CachedOutcome) -> None:
+        """チケットの最新の内容ハッシュと解析結果を保存する（チケットごとに1件）。"""
+        result_text, status, comment = outcome
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                with _DB_WRITE_SECONDS.time(operation="save_cached_analysis"):
+                    self._conn.execute(_UPSERT_CACHE_SQL, (str(issue_id), content_hash, result_text, status, comment))
+                    self._conn.commit()
+            except sqlite3.Error as exc:
+                self._conn.rollback()
+                logger.error("解析キャッシュの保存に失敗しました(issue_id=%s): %s", issue_id, exc)
+
+    # --- 通知アウトボックス ---
+    # state: pending（送信待ち）/ sending（送信中。next_attempt_at を過ぎると再取得可能）/ delivered / failed
+    # delivered / failed では next_attempt_at に最後の送信時刻を記録し、prune_notifications() の基準にする
+
+    def claim_notifications(self, limit: int, lease_seconds: float) -> List[dict]:
+        """送信期限を迎えた通知を最大limit件取得し、lease_seconds秒のあいだ送信中にする。"""
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                rows = self._conn.execute(
+                    """
+                    SELECT id, dedup_key, webhook, payload, label, attempts FROM notification_outbox
+                    WHERE state IN ('pending', 'sending') AND next_attempt_at <= ?
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE notification_outbox SET state = 'sending', attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                    [(now + lease_seconds, row[0]) for row in rows],
+                )
+                self._conn.commit()
+            except sqlite3.Error as exc:
+                self._conn.rollback()
+                logger.error("通知アウトボックスの取得に失敗しました: %s", exc)
+                return []
+
+        notifications = []
+        for notification_id, dedup_key, webhook, payload, label, attempts in rows:
+            try:
+                body = json.loads(payload)
+            except ValueError:
+                body = {}
+            notifications.append({
+                "id": notification_id,
+                "dedup_key": dedup_key,
+                "webhook": webhook,
+                "payload": body,
+                "label": label,
+                "attempts": attempts + 1,
+            })
+        return notifications
+
+    def mark_notification_delivered(self, notification_id: int) -> None:
+        with self._lock:
+            try:
+                self._conn.execute(
+                    """
+                    UPDATE notification_outbox
+                    SET state = 'delivered', last_error = NULL, next_attempt_at = ?,
+                        delivered_at = strftime('%Y-%m-%dT%H:%M:%SZ','now')
+                    WHERE id = ?
+                    """,
+                    (time.time(), notification_id),
+                )
+                self._conn.commit()
+            except sqlite3.Error as exc:
+                self._conn.rollback()
+                logger.error("通知の送信完了記録に失敗しました(id=%s): %s", notification_id, exc)
+
+    def mark_notification_failed(
+        self,
+        notification_id: int,
+        error: str,
+        *,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+    ) -> bool:
+        """送信失敗を記録する。上限未満なら指数バックオフ後に再送予定としてTrue、上限到達で failed にしてFalse。"""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT attempts FROM notification_outbox WHERE id = ?", (notification_id,)
+                ).fetchone()
+                if row is None:
+                    return False
+                attempts = row[0]
+                if attempts >= max_attempts:
+                    self._conn.execute(
+                        "UPDATE notification_outbox SET state = 'failed', last_error = ?, next_attempt_at = ? WHERE id = ?",
+                        (error, time.time(), notification_id),
+                    )
+                    retry = False
+                else:
+                    delay = min(backoff_base * 2 ** (attempts - 1), backoff_max)
+                    self._conn.execute(
+                        "UPDATE notification_outbox SET state = 'pending', last_error = ?, next_attempt_at = ? WHERE id = ?",
+                        (error, time.time() + delay, notification_id),
+                    )
+                    retry = True
+                self._conn.commit()
+                return retry
+            except sqlite3.Error as exc:
+                self._conn.rollback()
+                logger.error("通知の送信失敗記録に失敗しました(id=%s): %s", notification_id, exc)
+                return False
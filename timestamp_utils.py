@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from dateutil import parser
+
+# Redmine が返す "2024-01-02T03:04:05Z" 形式（秒の小数・オフセット付きを含む）
+_ISO_PATTERN = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?(?:[Zz]|[+-]\d{2}:?\d{2})?"
+)
+
+
+def parse_timestamp(ts: str) -> datetime:
+    """
+    タイムスタンプ文字列を datetime にする。ISO-8601 形式は datetime.fromisoformat で変換し、
+    それ以外の表記のみ dateutil にフォールバックする。オフセットのない入力は naive のまま返す。
+    変換できない場合は ValueError / TypeError などを送出する（dateutil.parser.parse と同じ）。
+    """
+    if isinstance(ts, str) and _ISO_PATTERN.fullmatch(ts):
+        if ts[-1] in "Zz":
+            ts = ts[:-1] + "+00:00"
+        try:
+            return datetime.fromisoformat(ts)
+        except ValueError:
+            pass  # 月日の範囲外など。dateutil 側で同じ例外を出させる
+    return parser.parse(ts)
+
+
+def parse_timestamp_utc(ts: str) -> datetime:
+    """parse_timestamp() の結果をUTCのawareなdatetimeにする。オフセットのない入力はUTCとみなす。"""
+    dt = parse_timestamp(ts)
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def normalize_timestamp(ts: str) -> Optional[str]:
+    """UTCのISO形式（例: 2024-01-02T03:04:05+00:00）に正規化する。変換できない場合は入力をそのまま返す。"""
+    try:
+        return parse_timestamp(ts).astimezone(timezone.utc).isoformat()
+    except Exception:
+        return ts
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import http_client
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_SEND_TOTAL = metrics.counter(
+    "teams_send_total", "Teams Webhook への送信結果（success / retry / failed）", ["path", "outcome"]
+)
+_SEND_SECONDS = metrics.histogram("teams_send_duration_seconds", "Teams Webhook への1回の送信の所要時間")
+
+
+class WebhookDispatcher:
+    """
+    Webhook（Teams / Power Automate）への送信を送信用スレッドプールで並列に行う。
+    失敗時は呼び出し元や送信スレッドでsleepせず、遅延キュー（専用スレッド）に積んで再送する。
+    post() はすぐに戻る。
+    """
+
+    def __init__(self, *, max_workers: int = 4, max_attempts: int = 3, backoff_base: float = 1.0):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhook")
+        self._retry_queue: List[Tuple[float, int, str, Dict[str, Any], int, Optional[str]]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._timer_thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def post(self, webhooks: Iterable[str], payload: Dict[str, Any], label: Optional[str] = None) -> None:
+        """各Webhookへの送信を並列に開始する。"""
+        for webhook in webhooks:
+            if webhook:
+                self._submit(webhook, payload, 1, label)
+
+    def send_once(self, webhook: str, payload: Dict[str, Any]) -> Future:
+        """1回だけ送信するFutureを返す（再送しない）。失敗時はFutureが例外を持つ。"""
+        return self._executor.submit(self._post, webhook, payload)
+
+    @staticmethod
+    def _post(webhook: str, payload: Dict[str, Any]) -> None:
+        with _SEND_SECONDS.time():
+            resp = http_client.request("POST", webhook, json=payload)
+        resp.raise_for_status()
+
+    def _submit(self, webhook: str, payload: Dict[str, Any], attempt: int, label: Optional[str]) -> None:
+        try:
+            self._executor.submit(self._send, webhook, payload, attempt, label)
+        except RuntimeError:
+            logger.error("Webhook送信を開始できません（停止処理中）: %s", webhook)
+
+    def _send(self, webhook: str, payload: Dict[str, Any], attempt: int, label: Optional[str]) -> None:
+        try:
+            self._post(webhook, payload)
+        except Exception as e:
+            logger.warning("Teams送信失敗(%d/%d): %s", attempt, self.max_attempts, e)
+            if attempt < self.max_attempts:
+                _SEND_TOTAL.inc(path="direct", outcome="retry")
+                self._schedule_retry(webhook, payload, attempt + 1, label)
+            else:
+                _SEND_TOTAL.inc(path="direct", outcome="failed")
+                logger.error("Teams送信が再送上限に達しました → %s", webhook)
+            return
+        _SEND_TOTAL.inc(path="direct", outcome="success")
+        suffix = f" ({label})" if label else ""
+        logger.info("Teams送信成功%s → %s", suffix, webhook)
+
+    def _schedule_retry(self, webhook: str, payload: Dict[str, Any], attempt: int, label: Optional[str]) -> None:
+        due = time.monotonic() + self.backoff_base * 2 ** (attempt - 2)
+        with self._cond:
+            if self._closed:
+                return
+            heapq.heappush(self._retry_queue, (due, next(self._seq), webhook, payload, attempt, label))
+            if self._timer_thread is None:
+                self._timer_thread = threading.Thread(target=self._run_retry_timer, name="webhook-retry", daemon=True)
+                self._timer_thread.start()
+            self._cond.notify()
+
+    def _run_retry_timer(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and (
+                    not self._retry_queue or self._retry_queue[0][0] > time.monotonic()
+                ):
+                    timeout = self._retry_queue[0][0] - time.monotonic() if self._retry_queue else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                _, _, webhook, payload, attempt, label = heapq.heappop(self._retry_queue)
+            self._submit(webhook, payload, attempt, label)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """送信中のリクエストを待って停止する。未実行の再送は破棄する。"""
+        with self._cond:
+            self._closed = True
+            dropped = len(self._retry_queue)
+            self._retry_queue.clear()
+            self._cond.notify_all()
+        if dropped:
+            logger.warning("未実行のTeams再送%d件を破棄しました。", dropped)
+        self._executor.shutdown(wait=wait)
+
+
+class OutboxSender:
+    """
+    状態DBの通知アウトボックス（StateStore.claim_notifications）を専用スレッドで送信する。
+    送信結果は送信済み／再送予定（指数バックオフ）／failed としてDBに記録するため、
+    再起動をまたいでも少なくとも1回は配信される。
+    """
+
+    def __init__(
+        self,
+        store,
+        dispatcher: WebhookDispatcher,
+        *,
+        poll_interval: float = 5.0,
+        batch_size: int = 20,
+        max_attempts: int = 8,
+        backoff_base: float = 5.0,
+        backoff_max: float = 600.0,
+        lease_seconds: float = 120.0,
+    ):
+        self.store = store
+        self.dispatcher = dispatcher
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        """新しい通知が登録されたときに呼ぶと、待機を打ち切って即座に送信する。"""
+        self._wakeup.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception as e:
+                logger.error("通知アウトボックスの送信処理でエラーが発生しました: %s", e)
+                sent = 0
+            if sent < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def drain_once(self) -> int:
+        """送信期限を迎えた通知を1バッチ分並列に送信し、処理件数を返す。"""
+        notifications = self.store.claim_notifications(self.batch_size, self.lease_seconds)
+        if not notifications:
+            return 0
+        futures = [
+            (item, self.dispatcher.send_once(item["webhook"], item["payload"]))
+            for item in notifications
+        ]
+        wait_futures([future for _, future in futures])
+        for item, future in futures:
+            error = future.exception()
+            suffix = f" ({item['label']})" if item.get("label") else ""
+            if error is None:
+                _SEND_TOTAL.inc(path="outbox", outcome="success")
+                self.store.mark_notification_delivered(item["id"])
+                logger.info("Teams送信成功%s → %s", suffix, item["webhook"])
+                continue
+            retry = self.store.mark_notification_failed(
+                item["id"],
+                str(error),
+                max_attempts=self.max_attempts,
+                backoff_base=self.backoff_base,
+                backoff_max=self.backoff_max,
+            )
+            _SEND_TOTAL.inc(path="outbox", outcome="retry" if retry else "failed")
+            if retry:
+                logger.warning("Teams送信失敗(%d/%d)%s: %s", item["attempts"], self.max_attempts, suffix, error)
+            else:
+                logger.error("Teams送信が再送上限に達しました%s → %s: %s", suffix, item["webhook"], error)
+        return len(notifications)